@@ -1,8 +1,11 @@
 import os
 import spacy
 import pandas as pd
-from tqdm import tqdm
-from groq import Groq
+
+from answer_selection import rank_answers
+from chunker import chunk_text, split_pages
+from llm_cache import get_cache
+from llm_gateway import run_completions
 
 # === CONFIG ===
 input_path = "full_pdf_text.txt"
@@ -10,32 +13,35 @@ output_csv = "generated_questions_from_txt.csv"
 max_questions_per_chunk = 5
 min_answer_len = 3
 max_answer_len = 20
+spacy_batch_size = 64
+spacy_n_process = 1  # >1 forks spaCy workers for large inputs
+candidate_pipes = ("tok2vec", "tagger", "attribute_ruler", "parser", "ner")  # needed by NER + noun_chunks
 
 # === LOAD MODELS ===
 print("🔄 Loading models...")
 nlp = spacy.load("en_core_web_sm")
 
-# === INIT GROQ CLIENT ===
-client = Groq(api_key=os.getenv("fill your groq api key here"))  # ⚡ put your Groq API key in env
+# === GROQ (via llm_gateway: concurrent, rate-limited, retried, cached on disk) ===
+groq_api_key = os.getenv("fill your groq api key here")  # ⚡ put your Groq API key in env
+groq_model = "llama3-8b-8192"  # ✅ Groq model name
+max_concurrent_requests = 8
+requests_per_second = 5.0
 
 # === UTILITIES ===
-def extract_answer_candidates(text):
-    doc = nlp(text)
-    answers = set()
-
-    # Named entities
-    for ent in doc.ents:
-        if min_answer_len <= len(ent.text.split()) <= max_answer_len:
-            answers.add(ent.text.strip())
+def candidates_from_doc(doc):
+    # Named entities + noun phrases: overlaps merged, duplicates dropped, best max_questions_per_chunk first
+    return rank_answers(doc, top_n=max_questions_per_chunk, min_words=min_answer_len, max_words=max_answer_len)
 
-    # Noun phrases
-    for np in doc.noun_chunks:
-        if min_answer_len <= len(np.text.split()) <= max_answer_len:
-            answers.add(np.text.strip())
+def extract_answer_candidates_batch(texts, batch_size=spacy_batch_size, n_process=spacy_n_process):
+    # One nlp.pipe pass over all chunks -> {chunk_index: candidates}
+    disable = [name for name in nlp.pipe_names if name not in candidate_pipes]
+    docs = nlp.pipe(texts, batch_size=batch_size, n_process=n_process, disable=disable)
+    return {idx: candidates_from_doc(doc) for idx, doc in enumerate(docs)}
 
-    return list(answers)
+def extract_answer_candidates(text):
+    return extract_answer_candidates_batch([text])[0]
 
-def generate_question(context, answer):
+def build_request(context, answer):
     if answer not in context:
         return None
 
@@ -46,43 +52,64 @@ Context: {highlighted}
 Answer: {answer}
 Generate a natural question whose answer is exactly "{answer}".
 """
+    return {
+        "model": groq_model,
+        "messages": [{"role": "user", "content": prompt}],
+        "max_tokens": 64,
+        "temperature": 0.7,
+    }
 
-    try:
-        response = client.chat.completions.create(
-            model="llama3-8b-8192",  # ✅ Groq model name
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=64,
-            temperature=0.7,
-        )
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        print(f"⚠️ API error: {e}")
+def generate_question(context, answer):
+    request = build_request(context, answer)
+    if request is None:
         return None
 
+    # Same path as the batch below (one request); errors come back as exceptions
+    response = run_completions([request], api_key=groq_api_key)[0]
+    if isinstance(response, Exception):
+        print(f"⚠️ API error: {response}")
+        return None
+    return response.strip()
+
 # === READ AND CHUNK TEXT ===
 with open(input_path, "r", encoding="utf-8") as f:
     raw_text = f.read()
 
-chunks = [chunk.strip() for chunk in raw_text.split("\n\n") if len(chunk.strip()) > 80]
+# Sentence-packed, token-budgeted chunks; page markers, headers / footers and near-duplicates dropped
+chunks = chunk_text(split_pages(raw_text))
 print(f"📄 Processing {len(chunks)} chunks...")
 
-# === GENERATE QUESTIONS ===
+# === EXTRACT ANSWER CANDIDATES (batched) ===
+candidates_by_chunk = extract_answer_candidates_batch(chunks)
+
+# === BUILD QG REQUESTS ===
+jobs = []  # (chunk, answer, request)
+for idx, chunk in enumerate(chunks):
+    for answer in candidates_by_chunk[idx]:  # ranked, capped at max_questions_per_chunk
+        request = build_request(chunk, answer)
+        if request is not None:
+            jobs.append((chunk, answer, request))
+
+# === GENERATE QUESTIONS (concurrent, rate-limited, retried) ===
+print(f"❓ Generating {len(jobs)} questions...")
+responses = run_completions(
+    [request for _, _, request in jobs],
+    api_key=groq_api_key,
+    max_concurrency=max_concurrent_requests,
+    rate_per_second=requests_per_second,
+)
+
 qa_pairs = []
-for idx, chunk in tqdm(enumerate(chunks), total=len(chunks)):
-    try:
-        candidates = extract_answer_candidates(chunk)
-        used = 0
-        for answer in candidates:
-            if used >= max_questions_per_chunk:
-                break
-            question = generate_question(chunk, answer)
-            if question:
-                qa_pairs.append((question, answer, chunk))
-                used += 1
-    except Exception as e:
-        print(f"⚠️ Error in chunk {idx + 1}: {e}")
+for (chunk, answer, _), response in zip(jobs, responses):
+    if isinstance(response, Exception):
+        print(f"⚠️ API error: {response}")
+        continue
+    question = response.strip()
+    if question:
+        qa_pairs.append((question, answer, chunk))
 
 # === SAVE TO CSV ===
 df = pd.DataFrame(qa_pairs, columns=["Question", "Answer", "Context"])
 df.to_csv(output_csv, index=False)
 print(f"\n✅ Saved {len(df)} question-answer pairs to: {output_csv}")
+print(f"🗄️ LLM cache: {get_cache().stats()}")
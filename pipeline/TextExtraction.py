@@ -1,7 +1,19 @@
+import json
+
 import pytesseract
-from pdf2image import convert_from_path
-from PIL import Image
-from pytesseract import Output
+
+from layout import analyze_layout, table_records
+from ocr_engine import (
+    OCR_PSM,
+    SOURCE_OCR,
+    SOURCE_TEXT_LAYER,
+    count_pages,
+    extract_text_layer,
+    format_page_ranges,
+    is_usable_text_layer,
+    ocr_page,
+    summarize_ocr_stats,
+)
 
 # Set Tesseract path
 pytesseract.pytesseract.tesseract_cmd = r"add your tesseract path here"  # e.g., r"C:\Program Files\Tesseract-OCR\tesseract.exe"
@@ -15,40 +27,70 @@ pdf_path = os.path.join(script_dir, "Test_Set_NOimg.pdf")  # ensures correct loc
 # Poppler bin path
 poppler_path = r"add your poppler path here"  # e.g., r"C:\path\to\poppler\bin"
 
-# Convert PDF to images (important: add poppler_path)
-pages = convert_from_path(pdf_path, dpi=300, poppler_path=poppler_path)
+# Page segmentation mode per page (e.g. {4: 6} for a page that is one uniform block / table); default OCR_PSM
+psm_by_page = {}
+
+# Embedded text layer (born-digital pages skip rasterization + OCR entirely)
+total_pages = count_pages(pdf_path, poppler_path)
+text_layer = extract_text_layer(pdf_path, poppler_path)
 
 # Store all text
 all_text = ""
+page_sources = {SOURCE_TEXT_LAYER: [], SOURCE_OCR: []}
+ocr_stats = []
+all_tables = []  # one record per table row, ready for insert_many
 
 # Loop through each page
-for i, image in enumerate(pages):
-    print(f"\n--- Page {i + 1} ---")
+for page in range(1, total_pages + 1):
+    layer_text = text_layer[page - 1] if page <= len(text_layer) else ""
+    source = SOURCE_TEXT_LAYER if is_usable_text_layer(layer_text) else SOURCE_OCR
+    page_sources[source].append(page)
+    print(f"\n--- Page {page} --- ({source})")
 
-    # OCR for plain text
-    raw_text = pytesseract.image_to_string(image)
-    all_text += f"\n\n--- Page {i + 1} ---\n{raw_text}"
+    if source == SOURCE_TEXT_LAYER:
+        raw_text = layer_text
+        layout_data = None
+    else:
+        # Adaptive OCR of only this page: grayscale at low DPI first, re-rendered at 300 DPI
+        # only if Tesseract's confidence is low; one image_to_data pass gives text + layout
+        raw_text, layout_data, stats = ocr_page(pdf_path, poppler_path, page, psm=psm_by_page.get(page, OCR_PSM))
+        ocr_stats.append(stats)
+        print(
+            f"⏱️ {stats.dpi} dpi, psm {stats.psm}, confidence {stats.confidence:.0f}, "
+            f"{stats.seconds:.2f}s (saved ~{stats.saved_seconds:.2f}s vs 300 dpi)"
+        )
+
+    all_text += f"\n\n--- Page {page} ---\n{raw_text}"
 
     print(f"\n📝 Extracted Text:\n{raw_text[:500]}")
 
-    # OCR with layout info
-    layout_data = pytesseract.image_to_data(image, output_type=Output.DICT)
+    # Layout analysis (OCR pages only): blocks in reading order + table grids from the same OCR pass
+    if layout_data is None:
+        continue
+    layout = analyze_layout(layout_data, page)
+    print(f"\n📐 Layout: {len(layout.blocks)} blocks in reading order")
+    for block in layout.blocks.itertuples():
+        print(f"→ Block {block.block_num} (column {block.column}) at (x={block.left}, y={block.top}): "
+              f"{block.text[:80]!r}")
 
-    # Table detection (basic)
-    lines = raw_text.split("\n")
-    table_like = [line for line in lines if "\t" in line or line.count(" ") > 5]
-    print("\n📊 Table-like Content:")
-    for row in table_like:
-        print(row)
+    print(f"\n📊 Tables: {len(layout.tables)}")
+    for index, table in enumerate(layout.tables):
+        print(table.to_string(index=False))
+        all_tables.extend(table_records(table, page, index))
 
-    # Layout analysis
-    print("\n📐 Layout Elements (text boxes):")
-    for j, text in enumerate(layout_data["text"]):
-        if int(layout_data["conf"][j]) > 60 and text.strip():
-            print(f"→ Text: '{text}' at (x={layout_data['left'][j]}, y={layout_data['top'][j]})")
+print(f"\n🧾 Text layer pages: {format_page_ranges(page_sources[SOURCE_TEXT_LAYER]) or 'none'}")
+print(f"🔍 OCR pages: {format_page_ranges(page_sources[SOURCE_OCR]) or 'none'}")
+if ocr_stats:
+    print(f"⏱️ OCR: {summarize_ocr_stats(ocr_stats)}")
 
 # Save full OCR result
 with open("full_pdf_text.txt", "w", encoding="utf-8") as f:
     f.write(all_text)
 
 print("\n✅ All page text saved to 'full_pdf_text.txt'")
+
+# Save table rows (page, table_index, row_index, cells)
+with open("full_pdf_tables.json", "w", encoding="utf-8") as f:
+    json.dump(all_tables, f, ensure_ascii=False, indent=2)
+
+print(f"✅ {len(all_tables)} table rows saved to 'full_pdf_tables.json'")
@@ -0,0 +1,102 @@
+# answer_selection.py
+"""
+Ranked, pruned answer candidates for question generation.
+
+Every candidate costs one beam-search call, so a chunk's NER + noun-chunk
+spans are cut down before QG:
+  1. spans outside the answer length range are dropped
+  2. spans are scored by a cheap salience measure (entity type, repeated
+     mentions in the chunk, position)
+  3. best first, a span is kept only if it does not overlap an already kept
+     span (an entity nested in a noun chunk -> one of them) and its text is
+     new; the first TOP_N survivors are returned
+Scores only use the chunk itself, so the selection is the same whatever
+micro-batch or resume point the chunk arrives in; ties break on position.
+"""
+from collections import Counter
+from typing import List, NamedTuple
+
+# =========================
+# === CONFIGURATION =======
+# =========================
+MIN_ANSWER_WORDS = 3
+MAX_ANSWER_WORDS = 20
+TOP_N = 5
+
+NOUN_CHUNK = "NOUN_CHUNK"
+LABEL_WEIGHTS = {
+    "PERSON": 1.0, "ORG": 1.0, "GPE": 0.9, "LOC": 0.9, "EVENT": 0.9, "LAW": 0.9, "DATE": 0.9,
+    "MONEY": 0.9, "FAC": 0.8, "PRODUCT": 0.8, "WORK_OF_ART": 0.8, "NORP": 0.8, "PERCENT": 0.8,
+    "LANGUAGE": 0.7, "QUANTITY": 0.7, "TIME": 0.7, "CARDINAL": 0.5, "ORDINAL": 0.4,
+    NOUN_CHUNK: 0.5,
+}
+DEFAULT_LABEL_WEIGHT = 0.6
+LABEL_SHARE = 0.5        # salience = 0.5 entity type + 0.3 repeated mentions + 0.2 position
+MENTION_SHARE = 0.3
+POSITION_SHARE = 0.2
+MENTION_CAP = 3          # repeats of a word beyond this do not add salience
+
+
+class AnswerSpan(NamedTuple):
+    text: str
+    start: int      # character offsets in the chunk
+    end: int
+    label: str      # spaCy entity label, or NOUN_CHUNK
+    score: float
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def _content_words(tokens) -> List[str]:
+    return [t.lower_ for t in tokens if t.is_alpha and not t.is_stop]
+
+
+def salience(label: str, words: List[str], start: int, word_counts: Counter, text_len: int) -> float:
+    """0..1 score from the entity type, how often the span's content words recur, and how early it appears."""
+    mentions = 0.0
+    if words:
+        mentions = sum(min(word_counts[w] - 1, MENTION_CAP) for w in words) / (MENTION_CAP * len(words))
+    position = 1.0 - start / text_len if text_len else 0.0
+    return (
+        LABEL_SHARE * LABEL_WEIGHTS.get(label, DEFAULT_LABEL_WEIGHT)
+        + MENTION_SHARE * mentions
+        + POSITION_SHARE * position
+    )
+
+
+def scored_spans(doc, min_words: int = MIN_ANSWER_WORDS, max_words: int = MAX_ANSWER_WORDS) -> List[AnswerSpan]:
+    """NER + noun-chunk spans of a parsed spaCy doc within the length range, with their salience."""
+    word_counts = Counter(_content_words(doc))
+    spans = []
+    for span, label in [(ent, ent.label_) for ent in doc.ents] + [(np, NOUN_CHUNK) for np in doc.noun_chunks]:
+        text = span.text.strip()
+        if not min_words <= len(text.split()) <= max_words:
+            continue
+        start = span.start_char + len(span.text) - len(span.text.lstrip())
+        score = salience(label, _content_words(span), start, word_counts, len(doc.text))
+        spans.append(AnswerSpan(text, start, start + len(text), label, score))
+    return spans
+
+
+def select_spans(spans: List[AnswerSpan], context: str, top_n: int = TOP_N) -> List[AnswerSpan]:
+    """Best `top_n` non-overlapping, distinct spans whose text occurs in `context`, best first."""
+    kept, seen = [], set()
+    for span in sorted(spans, key=lambda s: (-s.score, s.start, -(s.end - s.start), s.text)):
+        if len(kept) >= top_n:
+            break
+        key = _normalize(span.text)
+        if key in seen or span.text not in context:
+            continue
+        if any(span.start < other.end and other.start < span.end for other in kept):
+            continue
+        seen.add(key)
+        kept.append(span)
+    return kept
+
+
+def rank_answers(doc, top_n: int = TOP_N, min_words: int = MIN_ANSWER_WORDS,
+                 max_words: int = MAX_ANSWER_WORDS) -> List[str]:
+    """Answer texts to generate questions for, best first (at most `top_n`)."""
+    return [span.text for span in select_spans(scored_spans(doc, min_words, max_words), doc.text, top_n)]
@@ -0,0 +1,303 @@
+# batch_ingest.py
+"""
+Non-interactive batch ingest of many PDFs.
+
+    python batch_ingest.py <pdf directory | manifest.txt> [--workers 2] [--max-retries 2] [--job-timeout 7200]
+
+A manifest is a text file with one PDF path per line (blank lines and #
+comments are ignored). Documents are spread over a process pool; every
+worker loads the models once and runs process_pdf without ever prompting.
+Job status lives in a SQLite job table, so re-running the same command
+resumes where the last run stopped (finished documents are skipped).
+A job running longer than --job-timeout, or a worker that dies (e.g. killed
+for memory), costs that job an attempt; the pool is restarted and the batch
+goes on.
+"""
+import argparse
+import json
+import os
+import signal
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List
+
+# =========================
+# === CONFIGURATION =======
+# =========================
+JOBS_DB_PATH = "ingest_jobs.sqlite"
+SUMMARY_PATH = "ingest_summary.json"
+DEFAULT_WORKERS = 2        # each worker holds its own copy of the models (~1.5 GB)
+DEFAULT_MAX_RETRIES = 2
+JOB_TIMEOUT_SECONDS = 2 * 3600   # per document, model loading of a fresh worker included
+
+STATUS_PENDING = "pending"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+
+# =========================
+# === JOB TABLE ===========
+# =========================
+class JobTable:
+    """SQLite table of ingest jobs: one row per PDF with status, attempts, error and stats."""
+
+    def __init__(self, path: str = JOBS_DB_PATH):
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " pdf_path TEXT PRIMARY KEY,"
+            " status TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " error TEXT,"
+            " db_name TEXT,"
+            " pages INTEGER,"
+            " qa_pairs INTEGER,"
+            " seconds REAL,"
+            " updated_at REAL)"
+        )
+
+    def add(self, pdf_paths: List[str]) -> None:
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO jobs (pdf_path, status, updated_at) VALUES (?, ?, ?)",
+            [(path, STATUS_PENDING, time.time()) for path in pdf_paths],
+        )
+
+    def runnable(self, pdf_paths: List[str], max_attempts: int) -> List[str]:
+        """Jobs of this run that are not done and still have attempts left (stale 'running' rows included)."""
+        rows = self._conn.execute("SELECT pdf_path, status, attempts FROM jobs").fetchall()
+        state = {path: (status, attempts) for path, status, attempts in rows}
+        return [
+            path for path in pdf_paths
+            if state[path][0] != STATUS_DONE and state[path][1] < max_attempts
+        ]
+
+    def mark_running(self, pdf_path: str) -> None:
+        self._conn.execute(
+            "UPDATE jobs SET status = ?, attempts = attempts + 1, updated_at = ? WHERE pdf_path = ?",
+            (STATUS_RUNNING, time.time(), pdf_path),
+        )
+
+    def mark_done(self, pdf_path: str, result: Dict) -> None:
+        self._conn.execute(
+            "UPDATE jobs SET status = ?, error = NULL, db_name = ?, pages = ?, qa_pairs = ?, seconds = ?,"
+            " updated_at = ? WHERE pdf_path = ?",
+            (STATUS_DONE, result["db_name"], result["pages"], result["qa_pairs"], result["seconds"],
+             time.time(), pdf_path),
+        )
+
+    def mark_failed(self, pdf_path: str, error: str, final: bool) -> None:
+        self._conn.execute(
+            "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE pdf_path = ?",
+            (STATUS_FAILED if final else STATUS_PENDING, error, time.time(), pdf_path),
+        )
+
+    def release(self, pdf_path: str) -> None:
+        """Put a job interrupted through no fault of its own back to pending, refunding its attempt."""
+        self._conn.execute(
+            "UPDATE jobs SET status = ?, attempts = MAX(attempts - 1, 0), updated_at = ? WHERE pdf_path = ?",
+            (STATUS_PENDING, time.time(), pdf_path),
+        )
+
+    def attempts(self, pdf_path: str) -> int:
+        return self._conn.execute("SELECT attempts FROM jobs WHERE pdf_path = ?", (pdf_path,)).fetchone()[0]
+
+    def counts(self) -> Dict[str, int]:
+        return dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+
+# =========================
+# === WORKER ==============
+# =========================
+def _init_worker(ocr_workers: int) -> None:
+    """
+    Runs once per worker process: never prompt, share the cores, load every model once.
+    The worker leads its own process group, so _kill_pool also stops its OCR pool and
+    tesseract children (Ctrl+C reaches the parent only, which kills the pool on exit).
+    """
+    if hasattr(os, "setpgrp"):
+        os.setpgrp()
+
+    import database_name_decider
+    import ocr_engine
+    import torch
+    from full_flow import models
+
+    database_name_decider.INTERACTIVE_FALLBACK = False
+    ocr_engine.OCR_WORKERS = ocr_workers
+    ocr_engine.limit_tesseract_threads(ocr_workers)  # in-process OCR when the share is one core
+    torch.set_num_threads(ocr_workers)
+    models.preload()
+
+
+def _ingest_one(pdf_path: str) -> Dict:
+    from checkpoint import file_sha256
+    from full_flow import process_pdf
+
+    started = time.perf_counter()
+    db_name, _, collection = process_pdf(pdf_path)
+    metadata = collection.database["metadata"].find_one({"_id": file_sha256(pdf_path)}) or {}
+    return {
+        "db_name": db_name,
+        "pages": metadata.get("total_pages", 0),
+        "qa_pairs": metadata.get("total_qa_pairs", 0),
+        "seconds": time.perf_counter() - started,
+    }
+
+
+def _kill_pool(pool: ProcessPoolExecutor) -> None:
+    """
+    Stop a pool even if a worker is stuck (ProcessPoolExecutor cannot cancel a running task):
+    each worker's process group is killed, i.e. the worker with its OCR processes and tesseract calls.
+    """
+    processes = list((pool._processes or {}).values())
+    pool.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except (AttributeError, OSError):  # no process groups (Windows), or the worker had not set one up yet
+            if process.is_alive():
+                process.terminate()
+
+
+# =========================
+# === INPUTS ==============
+# =========================
+def collect_pdfs(source: str) -> List[str]:
+    """All PDFs under a directory (recursive), or the paths listed in a manifest file."""
+    if os.path.isdir(source):
+        return sorted(
+            os.path.abspath(os.path.join(root, name))
+            for root, _, names in os.walk(source)
+            for name in names if name.lower().endswith(".pdf")
+        )
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source, encoding="utf-8") as f:
+        lines = [line.strip() for line in f]
+    return [
+        os.path.abspath(os.path.join(base, line))
+        for line in lines if line and not line.startswith("#")
+    ]
+
+
+# =========================
+# === BATCH RUN ===========
+# =========================
+def run_batch(pdf_paths: List[str], workers: int, max_retries: int,
+              jobs_db: str = JOBS_DB_PATH, summary_path: str = SUMMARY_PATH,
+              job_timeout: float = JOB_TIMEOUT_SECONDS) -> Dict:
+    jobs = JobTable(jobs_db)
+    jobs.add(pdf_paths)
+    max_attempts = max_retries + 1
+    queue = deque(jobs.runnable(pdf_paths, max_attempts))
+    print(f"📚 {len(pdf_paths)} PDFs, {len(queue)} to ingest with {workers} workers")
+
+    ocr_workers = max(1, (os.cpu_count() or 1) // workers)
+    results: Dict[str, Dict] = {}
+    started = time.perf_counter()
+
+    def new_pool() -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(ocr_workers,))
+
+    def fail(path: str, error: str) -> None:
+        final = jobs.attempts(path) >= max_attempts
+        jobs.mark_failed(path, error, final)
+        print(f"❌ {path}: {error}" + ("" if final else " (will retry)"))
+        if not final:
+            queue.append(path)
+
+    pool = new_pool()
+    running: Dict = {}  # future -> (path, deadline)
+    try:
+        while queue or running:
+            # At most one job per worker, so a job's deadline starts when it actually starts
+            while queue and len(running) < workers:
+                path = queue.popleft()
+                jobs.mark_running(path)
+                running[pool.submit(_ingest_one, path)] = (path, time.monotonic() + job_timeout)
+
+            next_deadline = min(deadline for _, deadline in running.values())
+            finished, _ = wait(running, timeout=max(0.0, next_deadline - time.monotonic()),
+                               return_when=FIRST_COMPLETED)
+            restart = False
+            for future in finished:
+                path, _ = running.pop(future)
+                try:
+                    result = future.result()
+                except BrokenProcessPool:
+                    # A worker died (OOM kill, segfault): every job of the pool fails, the culprit is unknown
+                    restart = True
+                    fail(path, "worker process died (killed or out of memory?)")
+                    continue
+                except Exception as e:
+                    fail(path, repr(e))
+                    continue
+                jobs.mark_done(path, result)
+                results[path] = result
+                print(f"✅ {path}: {result['pages']} pages, {result['qa_pairs']} Q&A pairs in {result['seconds']:.0f}s")
+
+            now = time.monotonic()
+            expired = [future for future, (_, deadline) in running.items() if deadline <= now]
+            for future in expired:
+                fail(running.pop(future)[0], f"timed out after {job_timeout:.0f}s")
+            if expired:
+                # Stuck workers can only be killed with their pool; the other running jobs are innocent
+                restart = True
+                for future in list(running):
+                    path, _ = running.pop(future)
+                    jobs.release(path)
+                    queue.appendleft(path)
+
+            if restart:
+                for future in list(running):
+                    fail(running.pop(future)[0], "worker process died (killed or out of memory?)")
+                print("♻️ Restarting the worker pool")
+                _kill_pool(pool)
+                pool = new_pool()
+    finally:
+        for path, _ in running.values():  # interrupted run: don't leave jobs 'running'
+            jobs.release(path)
+        _kill_pool(pool)
+
+    wall_minutes = (time.perf_counter() - started) / 60
+    pages = sum(r["pages"] for r in results.values())
+    qa_pairs = sum(r["qa_pairs"] for r in results.values())
+    summary = {
+        "documents": len(pdf_paths),
+        "ingested_this_run": len(results),
+        "job_status": jobs.counts(),
+        "workers": workers,
+        "wall_minutes": round(wall_minutes, 2),
+        "pages": pages,
+        "qa_pairs": qa_pairs,
+        "pages_per_min": round(pages / wall_minutes, 2) if wall_minutes else 0.0,
+        "qa_pairs_per_min": round(qa_pairs / wall_minutes, 2) if wall_minutes else 0.0,
+    }
+    with open(summary_path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    print(f"\n📊 Summary ({summary_path}):\n{json.dumps(summary, indent=2)}")
+    return summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Ingest a directory or manifest of PDFs without prompts.")
+    parser.add_argument("source", help="directory of PDFs (searched recursively) or manifest file")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="worker processes")
+    parser.add_argument("--max-retries", type=int, default=DEFAULT_MAX_RETRIES, help="retries per failed PDF")
+    parser.add_argument("--jobs-db", default=JOBS_DB_PATH, help="SQLite job table")
+    parser.add_argument("--summary", default=SUMMARY_PATH, help="throughput summary JSON")
+    parser.add_argument("--job-timeout", type=float, default=JOB_TIMEOUT_SECONDS, help="seconds per PDF")
+    args = parser.parse_args()
+
+    pdf_paths = collect_pdfs(args.source)
+    if not pdf_paths:
+        print(f"⚠️ No PDFs found in {args.source}")
+        return
+    run_batch(pdf_paths, args.workers, args.max_retries, args.jobs_db, args.summary, args.job_timeout)
+
+
+if __name__ == "__main__":
+    main()
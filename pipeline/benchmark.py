@@ -0,0 +1,282 @@
+# benchmark.py
+"""
+Reproducible, offline, CPU-only benchmark of the ingest stages over the bundled PDFs.
+
+    python benchmark.py                                  # all bundled PDFs, mongomock
+    python benchmark.py --save-baseline                  # store the result as the new baseline
+    python benchmark.py --threshold 0.15 --mongo mongodb://localhost:27017
+
+Stages are timed one by one on the same inputs:
+  ocr     pages/sec        (text layer off by default -> measures Tesseract)
+  spacy   chunks/sec       (extract_answer_candidates_batch)
+  qg      questions/sec    (generate_questions_batch, first --max-questions inputs)
+  embed   embeddings/sec   (embed_qa_documents)
+  insert  inserts/sec      (write_qa_documents into mongomock or a local mongod)
+LLM calls (document heading, domain labels) are replaced by deterministic
+local stubs; models must already be in the local Hugging Face / spaCy cache.
+Results are written as JSON and compared against a baseline: a stage whose
+rate drops more than --threshold below the baseline is a regression (exit code 1).
+"""
+import os
+
+# Offline, CPU-only: must be set before torch / transformers are imported
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "")
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+import argparse
+import hashlib
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+import numpy as np
+
+import database_name_decider
+import full_flow
+from full_flow import (
+    POPLER_PATH, extract_answer_candidates_batch,
+    generate_questions_batch, highlight_answer, make_chunker, models,
+)
+from ocr_engine import OCR_ADAPTIVE, OCR_DPI, OCR_FAST_DPI, iter_pdf_pages
+from storage import embed_qa_documents, write_qa_documents
+
+# =========================
+# === CONFIGURATION =======
+# =========================
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BENCH_PDFS = ["ExamplePDF.pdf", "Student.pdf", "final_2011.pdf"]
+RESULTS_PATH = "benchmark_results.json"
+BASELINE_PATH = "benchmark_baseline.json"
+REGRESSION_THRESHOLD = 0.20   # fail when a stage is >20% slower than the baseline
+MAX_QUESTIONS = 64            # QG is the slowest stage; cap the inputs per PDF
+BENCH_SEED = 0
+BENCH_DB_NAME = "ingest_benchmark"
+
+STAGES = ("ocr", "spacy", "qg", "embed", "insert")
+STAGE_UNITS = {"ocr": "pages", "spacy": "chunks", "qg": "questions", "embed": "embeddings", "insert": "inserts"}
+
+
+# =========================
+# === STUBS ===============
+# =========================
+def stub_document_heading(raw_text, max_chars=50):
+    """Deterministic stand-in for the LLM title: first non-marker line of the text."""
+    first_line = next((line for line in raw_text.splitlines() if line.strip() and not line.startswith("---")), "")
+    return database_name_decider._sanitize_heading(first_line.strip(), max_chars) or "document_db"
+
+
+def stub_document_headings(raw_texts, max_chars=50):
+    return [stub_document_heading(text, max_chars) for text in raw_texts]
+
+
+def install_stubs(mongo: str) -> None:
+    """No remote LLM calls; MongoDB is mongomock ("mongomock") or the given URI."""
+    for module in (database_name_decider, full_flow):
+        module.get_document_heading = stub_document_heading
+        module.get_document_headings = stub_document_headings
+
+    if mongo == "mongomock":
+        try:
+            import mongomock
+        except ImportError:
+            sys.exit("❌ mongomock is not installed (pip install mongomock) - or pass --mongo <uri>")
+        models.register("mongo_client", mongomock.MongoClient)
+    else:
+        from pymongo import MongoClient
+        models.register("mongo_client", lambda: MongoClient(mongo))
+
+
+def seed_everything(seed: int = BENCH_SEED) -> None:
+    random.seed(seed)
+    np.random.seed(seed)
+    import torch
+    torch.manual_seed(seed)
+
+
+# =========================
+# === STAGE RUNS ==========
+# =========================
+def _timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+def _rate(items: int, seconds: float, stage: str) -> dict:
+    return {
+        "items": items,
+        "unit": STAGE_UNITS[stage],
+        "seconds": round(seconds, 4),
+        "per_sec": round(items / seconds, 3) if seconds else 0.0,
+    }
+
+
+def bench_pdf(pdf_path: str, use_text_layer: bool, max_questions: int) -> Dict[str, dict]:
+    """Run every stage once on one PDF; each stage consumes the previous stage's output."""
+    name = os.path.basename(pdf_path)
+    results = {}
+
+    pages, seconds = _timed(lambda: list(iter_pdf_pages(
+        pdf_path, POPLER_PATH, use_text_layer=use_text_layer,
+        tesseract_cmd=full_flow.pytesseract.tesseract_cmd,
+    )))
+    results["ocr"] = _rate(len(pages), seconds, "ocr")
+
+    chunker = make_chunker()
+    chunks = [c for page in pages for c in chunker.feed(page.text)] + list(chunker.flush())
+    candidates, seconds = _timed(lambda: extract_answer_candidates_batch(chunks))
+    results["spacy"] = _rate(len(chunks), seconds, "spacy")
+
+    qg_jobs = []  # (chunk_idx, answer, qg_input)
+    for idx, chunk in enumerate(chunks):
+        for answer in candidates[idx]:
+            qg_input = highlight_answer(chunk, answer)
+            if qg_input is not None:
+                qg_jobs.append((idx, answer, qg_input))
+    qg_jobs = qg_jobs[:max_questions]
+    questions, seconds = _timed(lambda: generate_questions_batch([qg_input for _, _, qg_input in qg_jobs]))
+    results["qg"] = _rate(len(qg_jobs), seconds, "qg")
+
+    docs = [
+        {
+            "_id": hashlib.sha1(f"{name}:{idx}:{answer}".encode("utf-8")).hexdigest(),
+            "heading": None,
+            "question": q,
+            "answer": answer,
+            "context": chunks[idx],
+            "chunk_index": idx,
+        }
+        for (idx, answer, _), q in zip(qg_jobs, questions)
+    ]
+    embedder = models.get("embedder")
+    n_texts = len({text for doc in docs for text in (doc["question"], doc["answer"])})
+    _, seconds = _timed(lambda: embed_qa_documents(embedder, docs))
+    results["embed"] = _rate(n_texts, seconds, "embed")
+
+    client = models.get("mongo_client")
+    client.drop_database(BENCH_DB_NAME)
+    collection = client[BENCH_DB_NAME]["structured_documents"]
+    written, seconds = _timed(lambda: write_qa_documents(collection, docs))
+    results["insert"] = _rate(written, seconds, "insert")
+    client.drop_database(BENCH_DB_NAME)
+    return results
+
+
+def summarize(per_pdf: Dict[str, Dict[str, dict]]) -> Dict[str, dict]:
+    """Stage totals over all PDFs (items / seconds summed, then divided)."""
+    totals = {}
+    for stage in STAGES:
+        items = sum(r[stage]["items"] for r in per_pdf.values())
+        seconds = sum(r[stage]["seconds"] for r in per_pdf.values())
+        totals[stage] = _rate(items, seconds, stage)
+    return totals
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, capture_output=True, text=True,
+        ).stdout.strip()
+    except OSError:
+        return ""
+
+
+def run_benchmark(pdf_paths: List[str], use_text_layer: bool = False, max_questions: int = MAX_QUESTIONS,
+                  repeat: int = 1) -> dict:
+    """Best of `repeat` runs per PDF and stage (models are loaded before timing starts)."""
+    seed_everything()
+    load_times = models.preload()
+
+    per_pdf = {}
+    for pdf_path in pdf_paths:
+        name = os.path.basename(pdf_path)
+        print(f"⏱️ {name}")
+        runs = [bench_pdf(pdf_path, use_text_layer, max_questions) for _ in range(repeat)]
+        per_pdf[name] = {stage: min((run[stage] for run in runs), key=lambda r: r["seconds"]) for stage in STAGES}
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "use_text_layer": use_text_layer,
+            "ocr": {"adaptive": OCR_ADAPTIVE, "fast_dpi": OCR_FAST_DPI, "dpi": OCR_DPI},
+            "max_questions": max_questions,
+            "repeat": repeat,
+        },
+        "model_load_seconds": {name: round(seconds, 3) for name, seconds in load_times.items()},
+        "pdfs": per_pdf,
+        "totals": summarize(per_pdf),
+    }
+
+
+# =========================
+# === BASELINE ============
+# =========================
+def compare(results: dict, baseline: dict, threshold: float) -> List[str]:
+    """Print a stage-by-stage comparison; returns the regressed stages."""
+    regressions = []
+    print(f"\n{'stage':<8}{'unit':>12}{'baseline/s':>12}{'now/s':>10}{'change':>9}")
+    for stage in STAGES:
+        now = results["totals"][stage]["per_sec"]
+        before = baseline.get("totals", {}).get(stage, {}).get("per_sec")
+        if not before:
+            print(f"{stage:<8}{STAGE_UNITS[stage]:>12}{'-':>12}{now:>10}{'':>9}")
+            continue
+        change = now / before - 1
+        regressed = change < -threshold
+        if regressed:
+            regressions.append(stage)
+        print(f"{stage:<8}{STAGE_UNITS[stage]:>12}{before:>12}{now:>10}{change:>+9.1%}" + (" ❌" if regressed else ""))
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline benchmark of the ingest stages.")
+    parser.add_argument("pdfs", nargs="*", help=f"PDFs to benchmark (default: {', '.join(BENCH_PDFS)})")
+    parser.add_argument("--output", default=RESULTS_PATH, help="results JSON")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="allowed slowdown (0.2 = 20%%)")
+    parser.add_argument("--mongo", default="mongomock", help="'mongomock' or a MongoDB URI (e.g. a local mongod)")
+    parser.add_argument("--max-questions", type=int, default=MAX_QUESTIONS, help="QG inputs per PDF")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per PDF, the fastest counts")
+    parser.add_argument("--text-layer", action="store_true", help="use embedded text layers instead of forcing OCR")
+    args = parser.parse_args()
+
+    pdf_paths = args.pdfs or [os.path.join(BENCH_DIR, name) for name in BENCH_PDFS]
+    install_stubs(args.mongo)
+    results = run_benchmark(pdf_paths, args.text_layer, args.max_questions, args.repeat)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"💾 Results written to {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"📌 Baseline saved to {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        compare(results, {}, args.threshold)
+        print(f"ℹ️ No baseline at {args.baseline} (run with --save-baseline)")
+        return
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"❌ Regression (> {args.threshold:.0%} slower): {', '.join(regressions)}")
+        sys.exit(1)
+    print("✅ No regressions")
+
+
+if __name__ == "__main__":
+    main()
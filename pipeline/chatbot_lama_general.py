@@ -1,18 +1,36 @@
+import os
 import sys
-from full_flow import process_pdf
+import time
+from full_flow import models, open_processed_database, process_pdf
+from vector_index import SIMILARITY_THRESHOLD, load_index
 from pymongo import MongoClient
 import requests
 import json
 from groq import Groq  # Import the Groq library
+from llm_cache import cached_completion
+from metrics import metrics
+from retrieval import PASSAGE_SEPARATOR, embed_query, retrieve_context
+from storage import read_change_counter
 
 # 🔑 Groq API setup
 # IMPORTANT: Replace "gsk_Your_Key_Here" with your actual Groq API key
 GROQ_API_KEY = "fill your groq api key here" 
+DEBUG_LLM = os.getenv("DEBUG_LLM", "0") == "1"  # dump model / messages / raw response of every Groq call
+CHANGE_CHECK_SECONDS = 2.0  # how often the question cache polls the metadata change counter
+
+_groq_client = None
+
+def get_groq_client():
+    """One Groq client per process -> HTTP connections are reused across questions."""
+    global _groq_client
+    if _groq_client is None:
+        _groq_client = Groq(api_key=GROQ_API_KEY)
+    return _groq_client
 
 def ask_llama(user_query, pdf_context=""):
     try:
-        # Initialize the Groq client
-        client = Groq(api_key=GROQ_API_KEY)
+        # Shared Groq client
+        client = get_groq_client()
 
         # The prompt should be structured as a list of message objects
         messages = []
@@ -31,49 +49,130 @@ def ask_llama(user_query, pdf_context=""):
         # Add the user's question
         messages.append({"role": "user", "content": user_query})
 
-        # Make the API call using the client.chat.completions.create method
-        chat_completion = client.chat.completions.create(
-            messages=messages,
-            model="llama3-8b-8192",  # Groq's model name for Llama 3 8B
-            temperature=0.5,
-            max_tokens=400
-        )
-        
-        # 🔍 Add debug prints here
-        print("\n--- DEBUG INFO ---")
-        print("🔍 Model:", "llama3-8b-8192")
-        print("🔍 Messages:", json.dumps(messages, indent=2))
-        print("🔍 Raw Response (Groq object):", chat_completion)
-        print("--- END DEBUG ---\n")
-
-        # The generated content is in chat_completion.choices[0].message.content
-        return chat_completion.choices[0].message.content.strip()
+        def groq_complete(model, messages, **params):
+            # Make the API call using the client.chat.completions.create method
+            chat_completion = client.chat.completions.create(messages=messages, model=model, **params)
+
+            # 🔍 Debug prints (DEBUG_LLM=1)
+            if DEBUG_LLM:
+                print("\n--- DEBUG INFO ---")
+                print("🔍 Model:", model)
+                print("🔍 Messages:", json.dumps(messages, indent=2))
+                print("🔍 Raw Response (Groq object):", chat_completion)
+                print("--- END DEBUG ---\n")
+
+            # The generated content is in chat_completion.choices[0].message.content
+            return chat_completion.choices[0].message.content
+
+        # Cached by (model, messages, sampling params) -> repeated questions skip the API
+        with metrics.timer("ask_llama"):
+            answer = cached_completion(
+                groq_complete,
+                model="llama3-8b-8192",  # Groq's model name for Llama 3 8B
+                messages=messages,
+                temperature=0.5,
+                max_tokens=400,
+            )
+        return answer.strip()
 
     except Exception as e:
         return f"⚠️ Error from Groq API: {e}"
 
+def find_pdf_answer(collection, user_query, threshold=SIMILARITY_THRESHOLD):
+    """Closest stored question by embedding similarity; None if below threshold."""
+    index = load_index(collection)
+    hits = index.search(embed_query(models.get("embedder"), user_query), k=1)
+    if not hits or hits[0][1] < threshold:
+        return None
+    doc_id, score = hits[0]
+    match = collection.find_one({"_id": doc_id}, {"_id": 0, "question": 1, "answer": 1})
+    if match:
+        print(f"🔗 Closest PDF question ({score:.2f}): {match['question']}")
+    return match
+
+def answer_custom_question(collection, user_query):
+    """Stored PDF answer if a question matches, else Llama grounded in the best PDF passages."""
+    # Step 1 → Try DB match first (semantic lookup over stored question embeddings)
+    db_answer = find_pdf_answer(collection, user_query)
+    if db_answer and db_answer.get("answer"):
+        print(f"\n📄 PDF Answer: {db_answer['answer']}")
+        return
+
+    # Step 2 → No stored answer → ask Llama with the retrieved PDF context (token-budgeted)
+    passages = retrieve_context(collection, models.get("embedder"), user_query)
+    if passages:
+        print(f"📚 Using {len(passages)} PDF passages as context")
+    answer = ask_llama(user_query, PASSAGE_SEPARATOR.join(passages))
+    print(f"\n💡 Llama Answer: {answer}")
+
+# ---------------- Question cache ----------------
+class QuestionCache:
+    """
+    Heading list and per-heading questions of one database, kept in memory.
+    Reads are served from the cache; it is emptied when the change counter in
+    `metadata` moves (a re-ingest wrote new Q&A pairs), checked at most every
+    CHANGE_CHECK_SECONDS with a single _id lookup.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+        self._version = None
+        self._checked_at = 0.0
+        self._headings = None
+        self._questions = {}
+
+    def _refresh(self):
+        now = time.monotonic()
+        if now - self._checked_at < CHANGE_CHECK_SECONDS:
+            return
+        self._checked_at = now
+        version = read_change_counter(self.collection.database)
+        if version != self._version:
+            self._version = version
+            self._headings = None
+            self._questions = {}
+
+    def headings(self):
+        self._refresh()
+        if self._headings is None:
+            self._headings = sorted(h for h in self.collection.distinct("heading") if h)
+        return self._headings
+
+    def questions(self, heading):
+        self._refresh()
+        if heading not in self._questions:
+            # served by the (heading, chunk_index) index, only the two displayed fields are fetched
+            self._questions[heading] = list(self.collection.find(
+                {"heading": heading},
+                {"_id": 0, "question": 1, "answer": 1}
+            ).sort("chunk_index", 1))
+        return self._questions[heading]
+
 # ---------------- Chatbot ----------------
 def chatbot():
     print("🤖 Welcome! Upload a PDF and I'll process it for you.")
 
-    # 1. User se PDF path lena
-    pdf_path = input("📂 Enter PDF path: ").strip()
+    # 1. User se PDF path lena (or an already-processed database to browse)
+    pdf_path = input("📂 Enter PDF path (or the name of an already-processed database): ").strip()
 
-    # 2. Process the PDF using full_flow_edit.py
+    # 2. Process the PDF using full_flow.py -- browsing an existing database loads no models
     try:
-        db, headings, collection = process_pdf(pdf_path)
+        opened = None if os.path.isfile(pdf_path) else open_processed_database(pdf_path)
+        db, headings, collection = opened or process_pdf(pdf_path)
     except Exception as e:
         print(f"❌ Error processing PDF: {e}")
         sys.exit(1)
 
-    # 3. Unique headings list banana
-    unique_headings = list(set(headings))
+    # 3. Unique headings list banana (cached, refreshed when the database changes)
+    cache = QuestionCache(collection)
+    unique_headings = cache.headings()
     if not unique_headings:
         print("⚠️ No headings found in the document.")
         return
 
     # ---- OUTER LOOP (Domains loop) ----
     while True:
+        unique_headings = cache.headings()
         print("\n📌 Available Domains/Headings:")
         for i, heading in enumerate(unique_headings, 1):
             print(f"{i}. {heading}")
@@ -86,20 +185,7 @@ def chatbot():
 
         if choice.lower() == "custom":
             user_query = input("\n❓ Enter your custom question: ")
-
-            # Step 1 → Try DB match first
-            db_answer = collection.find_one(
-                {"question": {"$regex": user_query, "$options": "i"}},
-                {"_id": 0, "question": 1, "answer": 1}
-            )
-
-            if db_answer and db_answer.get("answer"):
-                print(f"\n📄 PDF Answer: {db_answer['answer']}")
-            else:
-                # Step 2 → No PDF answer → ask Llama (general knowledge)
-                answer = ask_llama(user_query)
-                print(f"\n💡 Llama Answer: {answer}")
-
+            answer_custom_question(collection, user_query)
             continue
 
         # ---- If domain is chosen ----
@@ -114,10 +200,7 @@ def chatbot():
 
         # ---- INNER LOOP (Questions for that domain) ----
         while True:
-            questions = list(collection.find(
-                {"heading": selected_heading},
-                {"_id": 0, "question": 1, "answer": 1}
-            ))
+            questions = cache.questions(selected_heading)
 
             if not questions:
                 print(f"⚠️ No questions found for heading: {selected_heading}")
@@ -141,18 +224,7 @@ def chatbot():
 
             if q_choice.lower() == "custom":
                 user_query = input("\n❓ Enter your custom question: ")
-
-                db_answer = collection.find_one(
-                    {"question": {"$regex": user_query, "$options": "i"}},
-                    {"_id": 0, "question": 1, "answer": 1}
-                )
-
-                if db_answer and db_answer.get("answer"):
-                    print(f"\n📄 PDF Answer: {db_answer['answer']}")
-                else:
-                    # fallback → let Llama answer
-                    answer = ask_llama(user_query)
-                    print(f"\n💡 Llama Answer: {answer}")
+                answer_custom_question(collection, user_query)
 
                 input("\n🔁 Press Enter to continue...")
                 continue
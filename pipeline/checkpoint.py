@@ -0,0 +1,130 @@
+# checkpoint.py
+import hashlib
+import json
+import os
+import shutil
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import numpy as np
+
+# =========================
+# === CONFIGURATION =======
+# =========================
+CHECKPOINT_DIR = os.getenv("INGEST_CHECKPOINT_DIR", "ingest_checkpoints")
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def file_sha256(path: str) -> str:
+    """Content hash of a file, read in 1 MB blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# =========================
+# === CHECKPOINT STORE ====
+# =========================
+class IngestCheckpoint:
+    """
+    Persisted intermediate artifacts of one PDF ingest, keyed by the PDF content hash:
+      <CHECKPOINT_DIR>/<sha256>/
+        pages.jsonl          OCR / text-layer text (+ table records), one line per finished page
+        <stage>.json         whole-stage results (document heading, chunk settings, chunks, domains)
+        <stage>.npy          array results (chunk embeddings, one row per chunk index, NaN if not embedded)
+        <stage>.jsonl        per-chunk results, one line per finished chunk (questions)
+        written.jsonl        ids of documents already upserted into MongoDB
+    JSON stages are written atomically; JSONL files are append-only, so a
+    killed run keeps everything finished before the kill.
+    """
+
+    def __init__(self, pdf_path: str, root: str = CHECKPOINT_DIR):
+        self.pdf_hash = file_sha256(pdf_path)
+        self.dir = os.path.join(root, self.pdf_hash)
+        os.makedirs(self.dir, exist_ok=True)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.dir, name)
+
+    def reset(self) -> None:
+        """Forget every artifact of this PDF (full re-run)."""
+        shutil.rmtree(self.dir, ignore_errors=True)
+        os.makedirs(self.dir, exist_ok=True)
+
+    def discard(self, *names: str) -> None:
+        """Forget some artifacts (file names, e.g. "questions.jsonl"), keep the rest."""
+        for name in names:
+            if os.path.exists(self._path(name)):
+                os.remove(self._path(name))
+
+    def document_id(self, chunk_idx: int, answer: str) -> str:
+        """Deterministic MongoDB _id of a Q&A pair -> re-runs upsert instead of duplicating."""
+        return hashlib.sha1(f"{self.pdf_hash}:{chunk_idx}:{answer}".encode("utf-8")).hexdigest()
+
+    # ---------- JSONL helpers ----------
+    def _append_jsonl(self, name: str, record: Any) -> None:
+        with open(self._path(name), "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def _read_jsonl(self, name: str) -> Iterable[Any]:
+        path = self._path(name)
+        if not os.path.exists(path):
+            return
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn line from a killed run -> that record is simply recomputed
+
+    # ---------- pages ----------
+    def load_pages(self) -> Dict[int, dict]:
+        """{page_number: {"text": ..., "source": ..., ["tables": [...]]}} for every finished page."""
+        return {record["page"]: record for record in self._read_jsonl("pages.jsonl")}
+
+    def append_page(self, page: int, text: str, source: str, tables: Optional[List[dict]] = None) -> None:
+        record = {"page": page, "text": text, "source": source}
+        if tables:
+            record["tables"] = tables
+        self._append_jsonl("pages.jsonl", record)
+
+    # ---------- whole-stage artifacts ----------
+    def load(self, stage: str) -> Optional[Any]:
+        path = self._path(f"{stage}.json")
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def save(self, stage: str, data: Any) -> None:
+        path = self._path(f"{stage}.json")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+
+    def load_array(self, stage: str) -> Optional[np.ndarray]:
+        path = self._path(f"{stage}.npy")
+        return np.load(path) if os.path.exists(path) else None
+
+    def save_array(self, stage: str, array) -> None:
+        path = self._path(f"{stage}.npy")
+        with open(path + ".tmp", "wb") as f:
+            np.save(f, np.asarray(array))
+        os.replace(path + ".tmp", path)
+
+    # ---------- per-chunk artifacts ----------
+    def load_chunk_results(self, stage: str) -> Dict[int, Any]:
+        """{chunk_index: result} for every chunk finished in `stage`."""
+        return {record["chunk"]: record["result"] for record in self._read_jsonl(f"{stage}.jsonl")}
+
+    def append_chunk_result(self, stage: str, chunk_idx: int, result: Any) -> None:
+        self._append_jsonl(f"{stage}.jsonl", {"chunk": chunk_idx, "result": result})
+
+    # ---------- MongoDB writes ----------
+    def load_written_ids(self) -> Set[str]:
+        return {doc_id for ids in self._read_jsonl("written.jsonl") for doc_id in ids}
+
+    def append_written(self, docs) -> None:
+        """Remember which documents reached MongoDB (called after every write batch)."""
+        self._append_jsonl("written.jsonl", [doc["_id"] for doc in docs])
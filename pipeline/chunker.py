@@ -0,0 +1,275 @@
+# chunker.py
+import re
+import zlib
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# =========================
+# === CONFIGURATION =======
+# =========================
+CHUNK_MAX_TOKENS = 256        # T5 QG window is 512 tokens incl. prompt + <hl> markers
+CHUNK_OVERLAP_TOKENS = 0      # >0 repeats the last sentences of a chunk at the start of the next
+MIN_CHUNK_TOKENS = 24         # shorter leftovers are dropped (the old filter was > 80 chars)
+BOILERPLATE_MAX_CHARS = 100   # only short lines can be headers / footers
+BOILERPLATE_MIN_PAGES = 3     # a line seen on this many pages is boilerplate from then on
+BOILERPLATE_EDGE_LINES = 3    # only the first / last lines of a page (header / footer position) are checked
+DEDUP_THRESHOLD = 0.85        # estimated Jaccard similarity above which a chunk is a near-duplicate
+DEDUP_MIN_PARAGRAPH_WORDS = 20  # repeated paragraphs this long (disclaimers, notices) are dropped before packing
+MINHASH_PERMUTATIONS = 64
+MINHASH_BANDS = 16            # LSH: 16 bands x 4 rows
+SHINGLE_WORDS = 5
+
+PAGE_MARKER = re.compile(r"^\s*---\s*Page\s+\d+\s*---\s*$", re.MULTILINE | re.IGNORECASE)
+_SENTENCE_END = re.compile(r"(?<=[.!?])[\"')\]]*\s+(?=[\"'(\[]?[A-Z0-9])")
+_HYPHEN_BREAK = re.compile(r"(\w)-\n(\w)")
+_DIGITS = re.compile(r"\d+")
+_WORDS = re.compile(r"\w+")
+
+TokenCounter = Callable[[List[str]], List[int]]
+
+
+# =========================
+# === TOKEN COUNTING ======
+# =========================
+def hf_token_counter(tokenizer) -> TokenCounter:
+    """Token counts from a Hugging Face tokenizer (one batched call per page)."""
+    def count(texts: List[str]) -> List[int]:
+        if not texts:
+            return []
+        return [len(ids) for ids in tokenizer(texts, add_special_tokens=False)["input_ids"]]
+    return count
+
+
+def approx_token_counter(texts: List[str]) -> List[int]:
+    """~4/3 sub-word tokens per word; used when no tokenizer is at hand."""
+    return [len(text.split()) * 4 // 3 + 1 for text in texts]
+
+
+# =========================
+# === TEXT CLEANUP ========
+# =========================
+def _normalize(text: str, fold_digits: bool = False) -> str:
+    """Lower-case, single spaces; fold_digits (digits -> 0) makes "Page 3 of 10" equal "Page 4 of 10"."""
+    text = text.lower()
+    if fold_digits:
+        text = _DIGITS.sub("0", text)
+    return " ".join(text.split())
+
+
+def split_paragraphs(text: str) -> List[str]:
+    """Paragraphs (blank-line separated) with OCR line breaks and hyphenation joined."""
+    paragraphs = (" ".join(p.split()) for p in re.split(r"\n\s*\n", _HYPHEN_BREAK.sub(r"\1\2", text)))
+    return [p for p in paragraphs if p]
+
+
+def _paragraph_sentences(paragraph: str) -> List[str]:
+    return [s.strip() for s in _SENTENCE_END.split(paragraph) if s.strip()]
+
+
+def split_sentences(text: str) -> List[str]:
+    """Regex sentence split; OCR line breaks inside a paragraph are joined first."""
+    return [s for paragraph in split_paragraphs(text) for s in _paragraph_sentences(paragraph)]
+
+
+class BoilerplateFilter:
+    """
+    Drops page markers and short header / footer lines that repeat across
+    pages. Only the first and last `edge_lines` non-empty lines of a page are
+    candidates, and only there are digits folded (page numbers); table rows
+    and numbers in the body are never compared.
+    """
+
+    def __init__(self, min_pages: int = BOILERPLATE_MIN_PAGES, max_chars: int = BOILERPLATE_MAX_CHARS,
+                 edge_lines: int = BOILERPLATE_EDGE_LINES):
+        self.min_pages = min_pages
+        self.max_chars = max_chars
+        self.edge_lines = edge_lines
+        self._pages_seen: Dict[str, int] = {}
+
+    def clean(self, page_text: str) -> str:
+        page_text = PAGE_MARKER.sub("", page_text)
+        lines = page_text.split("\n")
+        filled = [i for i, line in enumerate(lines) if line.strip()]
+        edges = set(filled[:self.edge_lines] + filled[max(len(filled) - self.edge_lines, 0):])
+        keys = [
+            _normalize(line, fold_digits=True) if i in edges and len(line.strip()) <= self.max_chars else ""
+            for i, line in enumerate(lines)
+        ]
+        for key in set(keys) - {""}:
+            self._pages_seen[key] = self._pages_seen.get(key, 0) + 1
+        return "\n".join(
+            line for line, key in zip(lines, keys)
+            if not key or self._pages_seen[key] < self.min_pages
+        )
+
+
+# =========================
+# === DEDUPLICATION =======
+# =========================
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+class NearDuplicateFilter:
+    """
+    Exact (normalized hash) + near-duplicate (MinHash over word shingles,
+    LSH-banded) detection. Hashes are crc32 based, so results are the same
+    in every process and run (Python's hash() is salted per process).
+    """
+
+    def __init__(self, threshold: float = DEDUP_THRESHOLD, num_perm: int = MINHASH_PERMUTATIONS,
+                 bands: int = MINHASH_BANDS, shingle_words: int = SHINGLE_WORDS, seed: int = 1):
+        rng = np.random.RandomState(seed)
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_words = shingle_words
+        self._a = rng.randint(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._exact = set()
+        self._buckets: Dict[bytes, List[int]] = {}
+        self._signatures: List[np.ndarray] = []
+
+    def _signature(self, normalized: str) -> np.ndarray:
+        words = _WORDS.findall(normalized)
+        n = max(1, len(words) - self.shingle_words + 1)
+        shingles = {" ".join(words[i:i + self.shingle_words]) for i in range(n)}
+        hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+        # (a*x + b) mod p, x < 2^32 and a, b < 2^32 -> no uint64 overflow
+        permuted = (hashes[:, None] * self._a + self._b) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=0)
+
+    def is_duplicate(self, text: str) -> bool:
+        """True if `text` (almost) repeats an earlier text; otherwise it is remembered."""
+        normalized = _normalize(text)
+        key = zlib.crc32(normalized.encode("utf-8"))
+        if key in self._exact:
+            return True
+
+        signature = self._signature(normalized)
+        band_keys = [signature[i * self.rows:(i + 1) * self.rows].tobytes() + bytes([i]) for i in range(self.bands)]
+        candidates = {idx for band_key in band_keys for idx in self._buckets.get(band_key, ())}
+        for idx in candidates:
+            if np.mean(self._signatures[idx] == signature) >= self.threshold:
+                return True
+
+        self._exact.add(key)
+        idx = len(self._signatures)
+        self._signatures.append(signature)
+        for band_key in band_keys:
+            self._buckets.setdefault(band_key, []).append(idx)
+        return False
+
+
+# =========================
+# === CHUNKER =============
+# =========================
+class Chunker:
+    """
+    Streaming sentence packer: feed() page texts in order, get chunks of up to
+    `max_tokens` tokens (measured with `count_tokens`, e.g. the QG tokenizer)
+    back as soon as they are full; flush() returns the rest. Page markers and
+    repeating headers / footers are stripped, repeated long paragraphs are
+    dropped before packing (a disclaimer mixed into different chunks would
+    never match as a whole chunk), sentences longer than the budget are split
+    on words, and near-duplicate chunks are dropped before any model sees
+    them. Same pages + same settings -> same chunks (resumable).
+    """
+
+    def __init__(
+        self,
+        count_tokens: TokenCounter = approx_token_counter,
+        max_tokens: int = CHUNK_MAX_TOKENS,
+        overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+        min_tokens: int = MIN_CHUNK_TOKENS,
+        dedup: bool = True,
+        paragraph_dedup_min_words: int = DEDUP_MIN_PARAGRAPH_WORDS,
+        boilerplate_edge_lines: int = BOILERPLATE_EDGE_LINES,
+    ):
+        self.count_tokens = count_tokens
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.min_tokens = min(min_tokens, max_tokens // 2)
+        self.boilerplate = BoilerplateFilter(edge_lines=boilerplate_edge_lines)
+        self.duplicates = NearDuplicateFilter() if dedup else None
+        # Separate filter: a chunk that is exactly one kept paragraph must not match that paragraph
+        self.paragraph_duplicates = NearDuplicateFilter() if dedup else None
+        self.paragraph_dedup_min_words = paragraph_dedup_min_words
+        self.dropped_duplicates = 0
+        self.dropped_paragraphs = 0
+        self._sentences: List[str] = []
+        self._tokens: List[int] = []
+        self._carried = 0  # leading sentences repeated from the previous chunk (overlap)
+
+    def _split_long(self, sentence: str, tokens: int) -> Iterator[Tuple[str, int]]:
+        if tokens <= self.max_tokens:
+            yield sentence, tokens
+            return
+        words = sentence.split()
+        step = max(1, len(words) * self.max_tokens // tokens)
+        pieces = [" ".join(words[i:i + step]) for i in range(0, len(words), step)]
+        yield from zip(pieces, self.count_tokens(pieces))
+
+    def _emit(self) -> Optional[str]:
+        text = " ".join(self._sentences)
+        total = sum(self._tokens)
+        keep, kept_tokens = 0, 0
+        while keep < len(self._tokens) - 1 and kept_tokens + self._tokens[-keep - 1] <= self.overlap_tokens:
+            kept_tokens += self._tokens[-keep - 1]
+            keep += 1
+        self._sentences = self._sentences[len(self._sentences) - keep:]
+        self._tokens = self._tokens[len(self._tokens) - keep:]
+        self._carried = keep
+        if total < self.min_tokens:
+            return None
+        if self.duplicates is not None and self.duplicates.is_duplicate(text):
+            self.dropped_duplicates += 1
+            return None
+        return text
+
+    def _is_repeated_paragraph(self, paragraph: str) -> bool:
+        if self.paragraph_duplicates is None or len(paragraph.split()) < self.paragraph_dedup_min_words:
+            return False
+        if self.paragraph_duplicates.is_duplicate(paragraph):
+            self.dropped_paragraphs += 1
+            return True
+        return False
+
+    def feed(self, page_text: str) -> Iterator[str]:
+        paragraphs = split_paragraphs(self.boilerplate.clean(page_text))
+        sentences = [
+            s for paragraph in paragraphs if not self._is_repeated_paragraph(paragraph)
+            for s in _paragraph_sentences(paragraph)
+        ]
+        for sentence, tokens in zip(sentences, self.count_tokens(sentences)):
+            for piece, piece_tokens in self._split_long(sentence, tokens):
+                if sum(self._tokens) + piece_tokens > self.max_tokens:
+                    if len(self._sentences) > self._carried:
+                        chunk = self._emit()
+                        if chunk is not None:
+                            yield chunk
+                    if sum(self._tokens) + piece_tokens > self.max_tokens:  # overlap doesn't fit either
+                        self._sentences, self._tokens, self._carried = [], [], 0
+                self._sentences.append(piece)
+                self._tokens.append(piece_tokens)
+
+    def flush(self) -> Iterator[str]:
+        if len(self._sentences) > self._carried:
+            chunk = self._emit()
+            if chunk is not None:
+                yield chunk
+        self._sentences, self._tokens, self._carried = [], [], 0
+
+
+def split_pages(text: str) -> List[str]:
+    """Split a text with `--- Page N ---` markers (TextExtraction output) back into pages."""
+    return [page for page in PAGE_MARKER.split(text) if page.strip()]
+
+
+def chunk_text(pages: Iterable[str], **chunker_kwargs) -> List[str]:
+    """All chunks of a sequence of page texts (see Chunker)."""
+    chunker = Chunker(**chunker_kwargs)
+    chunks = [chunk for page in pages for chunk in chunker.feed(page)]
+    chunks.extend(chunker.flush())
+    return chunks
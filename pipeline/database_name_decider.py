@@ -1,55 +1,109 @@
 # database_name_decider.py
 import re
-from huggingface_hub import InferenceClient
+
+from llm_cache import cached_completion
+from llm_gateway import run_completions
 
 # =========================
 # === HF API CONFIGURATION ===
 # =========================
 HF_API_TOKEN = "fill your lama api key here"  # replace with your actual key
 HF_MODEL = "meta-llama/Meta-Llama-3-8B-Instruct"
+HF_BASE_URL = f"https://api-inference.huggingface.co/models/{HF_MODEL}/v1"  # OpenAI-compatible route
 
-# Initialize Hugging Face client
-hf_client = InferenceClient(HF_MODEL, token=HF_API_TOKEN)
+# False -> never prompt on API failure (batch / unattended runs); the title
+# falls back to the first line of the text instead
+INTERACTIVE_FALLBACK = True
 
+# Hugging Face client (created on first use -> importing this module stays fast)
+_hf_client = None
+
+
+def get_hf_client():
+    global _hf_client
+    if _hf_client is None:
+        from huggingface_hub import InferenceClient
+        _hf_client = InferenceClient(HF_MODEL, token=HF_API_TOKEN)
+    return _hf_client
 
-def get_document_heading(raw_text, max_chars=50):
-    """
-    Generate a concise, meaningful title for a document using LLaMA 3 API.
-    If API fails, prompt the user to manually enter a title.
-    """
 
-    prompt = (
+def _hf_complete(model, messages, **params):
+    """Raw chat completion against the HF Inference API (used through the LLM cache)."""
+    print("📡 Requesting title from Hugging Face API...")
+    response = get_hf_client().chat_completion(messages=messages, **params)
+    print("🔍 Raw API Response:", response)
+    return response.choices[0].message["content"]
+
+
+def _heading_prompt(raw_text):
+    return (
         "You are an AI assistant. Generate a short and meaningful title "
         "for the following document (less than 10 words). "
         "Return ONLY the title without quotes or punctuation:\n\n"
         f"{raw_text[:2000]}"
     )
 
-    try:
-        print("📡 Requesting title from Hugging Face API...")
-        response = hf_client.chat_completion(
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=30
-        )
 
-        print("🔍 Raw API Response:", response)
+def _sanitize_heading(heading, max_chars):
+    # sanitize for MongoDB DB name
+    heading = "".join(c for c in heading if c.isalnum() or c in "_- ")
+    heading = re.sub(r'_+', '_', heading).strip('_')
+    return heading[:max_chars]
 
-        heading = response.choices[0].message["content"].strip()
 
-        # sanitize for MongoDB DB name
-        heading = "".join(c for c in heading if c.isalnum() or c in "_- ")
-        heading = re.sub(r'_+', '_', heading).strip('_')
+def get_document_heading(raw_text, max_chars=50):
+    """
+    Generate a concise, meaningful title for a document using LLaMA 3 API.
+    If API fails, prompt the user to manually enter a title
+    (or, with INTERACTIVE_FALLBACK off, use the text's first line).
+    """
+
+    prompt = _heading_prompt(raw_text)
+
+    try:
+        heading = cached_completion(
+            _hf_complete,
+            model=HF_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=30
+        ).strip()
 
+        heading = _sanitize_heading(heading, max_chars)
         if not heading:
             raise ValueError("Empty heading from LLaMA API")
 
-        return heading[:max_chars]
+        return heading
 
     except Exception as e:
         print(f"⚠️ AI title generation failed: {e}")
+        if not INTERACTIVE_FALLBACK:
+            first_line = next((line for line in raw_text.splitlines() if line.strip() and not line.startswith("---")), "")
+            return _sanitize_heading(first_line.strip(), max_chars) or "document_db"
         # Manual fallback
         manual = input("❓ Please enter a title for this document: ").strip()
         if manual:
             heading = "".join(c for c in manual if c.isalnum() or c in "_- ")
             return heading[:max_chars]
         return "document_db"
+
+
+def get_document_headings(raw_texts, max_chars=50):
+    """
+    Headings for many texts at once: requests run concurrently through the
+    async LLM gateway. Texts whose request fails fall back to get_document_heading.
+    """
+    print(f"📡 Requesting {len(raw_texts)} titles from Hugging Face API...")
+    responses = run_completions(
+        [
+            {"model": HF_MODEL, "messages": [{"role": "user", "content": _heading_prompt(text)}], "max_tokens": 30}
+            for text in raw_texts
+        ],
+        base_url=HF_BASE_URL,
+        api_key=HF_API_TOKEN,
+    )
+
+    headings = []
+    for text, response in zip(raw_texts, responses):
+        heading = "" if isinstance(response, Exception) else _sanitize_heading(response.strip(), max_chars)
+        headings.append(heading or get_document_heading(text, max_chars))
+    return headings
@@ -0,0 +1,127 @@
+# domain_labeller.py
+import math
+import re
+from collections import Counter
+from typing import Callable, List, Optional
+
+import numpy as np
+
+# =========================
+# === CONFIGURATION =======
+# =========================
+DOMAIN_LABEL_MODE = "llm"       # "llm" -> one heading call per cluster, "keyphrase" -> fully local
+CHUNKS_PER_DOMAIN = 8           # target cluster size, k = ceil(chunks / CHUNKS_PER_DOMAIN)
+MAX_DOMAINS = 12
+KMEANS_ITERATIONS = 25
+KMEANS_SEED = 0                 # fixed seed -> same domains on every run
+REPRESENTATIVE_CHUNKS = 3       # chunks closest to the centroid sent to the labeller
+KEYPHRASE_TERMS = 3
+
+STOPWORDS = set("""
+a about above after again all also an and any are as at be because been before being below between both
+but by can could did do does doing down during each few for from further had has have having he her here
+hers him his how i if in into is it its itself just may me might more most must my no nor not now of off
+on once only or other our ours out over own page same shall she should so some such than that the their
+theirs them then there these they this those through to too under until up upon very was we were what
+when where which while who whom why will with would you your
+""".split())
+
+
+# =========================
+# === CLUSTERING ==========
+# =========================
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    return matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+
+def cluster_embeddings(vectors, k: int, iterations: int = KMEANS_ITERATIONS, seed: int = KMEANS_SEED):
+    """
+    Spherical k-means (cosine) with k-means++ seeding.
+    Returns: (labels[n], centroids[k, dim]) with L2-normalised centroids.
+    """
+    X = _normalize(np.asarray(vectors, dtype=np.float32))
+    n = len(X)
+    k = max(1, min(k, n))
+    rng = np.random.default_rng(seed)
+
+    # k-means++ seeding on cosine distance
+    centroids = [X[rng.integers(n)]]
+    for _ in range(1, k):
+        distance = 1.0 - np.max(X @ np.stack(centroids).T, axis=1)
+        distance = np.clip(distance, 0.0, None)
+        total = distance.sum()
+        idx = rng.choice(n, p=distance / total) if total > 0 else rng.integers(n)
+        centroids.append(X[idx])
+    centroids = np.stack(centroids)
+
+    labels = np.zeros(n, dtype=np.int64)
+    for i in range(iterations):
+        similarity = X @ centroids.T
+        new_labels = similarity.argmax(axis=1)
+        if i and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        for c in range(k):
+            members = X[labels == c]
+            # Empty cluster -> re-seed with the point worst served by its centroid
+            centroids[c] = members.mean(axis=0) if len(members) else X[similarity.max(axis=1).argmin()]
+        centroids = _normalize(centroids)
+    return labels, centroids
+
+
+# =========================
+# === LABELLING ===========
+# =========================
+def _terms(text: str) -> List[str]:
+    return [t for t in re.findall(r"[a-z][a-z\-]{2,}", text.lower()) if t not in STOPWORDS]
+
+
+def keyphrase_label(cluster_texts: List[str], all_texts: List[str], n_terms: int = KEYPHRASE_TERMS) -> str:
+    """Local label: top TF-IDF terms of the cluster against all chunks of the document."""
+    doc_freq = Counter(term for text in all_texts for term in set(_terms(text)))
+    term_freq = Counter(term for text in cluster_texts for term in _terms(text))
+    n_docs = len(all_texts)
+    scored = sorted(
+        term_freq,
+        key=lambda t: (-term_freq[t] * math.log((1 + n_docs) / (1 + doc_freq[t])), t),
+    )
+    return " ".join(term.title() for term in scored[:n_terms]) or "General"
+
+
+def label_domains(
+    chunks: List[str],
+    chunk_vectors,
+    mode: str = DOMAIN_LABEL_MODE,
+    llm_labeller: Optional[Callable[[List[str]], List[str]]] = None,
+) -> List[str]:
+    """
+    Assign a domain heading to every chunk:
+      1) cluster the chunk embeddings
+      2) label each cluster once: llm_labeller gets one text per cluster (its most
+         central chunks) in a single batched call; otherwise local keyphrases
+      3) every chunk inherits its cluster's heading
+    Returns one heading per chunk, in chunk order.
+    """
+    if not chunks:
+        return []
+    k = min(MAX_DOMAINS, math.ceil(len(chunks) / CHUNKS_PER_DOMAIN))
+    labels, centroids = cluster_embeddings(chunk_vectors, k)
+    X = _normalize(np.asarray(chunk_vectors, dtype=np.float32))
+
+    clusters = [int(c) for c in np.unique(labels)]
+    members = {c: np.flatnonzero(labels == c) for c in clusters}
+
+    if mode == "llm" and llm_labeller is not None:
+        representative_texts = []
+        for c in clusters:
+            central = members[c][np.argsort(-(X[members[c]] @ centroids[c]))][:REPRESENTATIVE_CHUNKS]
+            representative_texts.append("\n\n".join(chunks[i] for i in central))
+        headings = llm_labeller(representative_texts)
+    else:
+        headings = [keyphrase_label([chunks[i] for i in members[c]], chunks) for c in clusters]
+
+    cluster_headings = dict(zip(clusters, headings))
+    for c in clusters:
+        print(f"🧭 Domain '{cluster_headings[c]}': {len(members[c])} chunks")
+
+    return [cluster_headings[c] for c in labels]
@@ -0,0 +1,72 @@
+# embedding_codec.py
+import os
+import struct
+from typing import Iterable, List
+
+import numpy as np
+
+# =========================
+# === CONFIGURATION =======
+# =========================
+EMBEDDING_DTYPE = os.getenv("EMBEDDING_DTYPE", "float16")   # "float16" | "int8" | "float32"
+
+# Packed layout: [version:u8][dtype:u8][scale:f32, int8 only][little-endian payload]
+FORMAT_VERSION = 1
+_DTYPE_CODES = {"float32": 1, "float16": 2, "int8": 3}
+_NUMPY_DTYPES = {1: np.dtype("<f4"), 2: np.dtype("<f2"), 3: np.dtype("i1")}
+_SCALE = struct.Struct("<f")
+
+
+# =========================
+# === ENCODING ============
+# =========================
+def encode_vector(vector, dtype: str = EMBEDDING_DTYPE) -> bytes:
+    """
+    Pack one embedding into bytes (stored by MongoDB as BSON binary):
+      float32  4 bytes / dim, lossless
+      float16  2 bytes / dim, ~1e-3 relative error (default)
+      int8     1 byte / dim + a 4-byte scale (symmetric, max |x| -> 127)
+    A 384-dim vector is 770 / 390 bytes instead of ~5 KB as a BSON double array.
+    """
+    code = _DTYPE_CODES[dtype]
+    vector = np.asarray(vector, dtype=np.float32).ravel()
+    header = bytes((FORMAT_VERSION, code))
+    if dtype == "int8":
+        scale = float(np.abs(vector).max()) / 127 if vector.size else 0.0
+        quantized = np.round(vector / scale) if scale else np.zeros_like(vector)
+        return header + _SCALE.pack(scale) + quantized.astype(np.int8).tobytes()
+    return header + vector.astype(_NUMPY_DTYPES[code]).tobytes()
+
+
+def encode_vectors(vectors, dtype: str = EMBEDDING_DTYPE) -> List[bytes]:
+    """encode_vector for every row of a matrix."""
+    return [encode_vector(row, dtype) for row in np.asarray(vectors, dtype=np.float32)]
+
+
+# =========================
+# === DECODING ============
+# =========================
+def decode_vector(value) -> np.ndarray:
+    """
+    float32 array from a packed embedding; legacy documents that still store
+    a list of floats are accepted too. Packed payloads are read with
+    np.frombuffer, no Python object per element.
+    """
+    if not isinstance(value, (bytes, bytearray, memoryview)):
+        return np.asarray(value, dtype=np.float32)
+    buffer = memoryview(value)
+    if buffer[0] != FORMAT_VERSION:
+        raise ValueError(f"Unknown embedding format version {buffer[0]}")
+    code = buffer[1]
+    if code == _DTYPE_CODES["int8"]:
+        (scale,) = _SCALE.unpack_from(buffer, 2)
+        return np.frombuffer(buffer, dtype=np.int8, offset=2 + _SCALE.size).astype(np.float32) * np.float32(scale)
+    return np.frombuffer(buffer, dtype=_NUMPY_DTYPES[code], offset=2).astype(np.float32)
+
+
+def decode_vectors(values: Iterable) -> np.ndarray:
+    """Stack many stored embeddings into one (n, dim) float32 matrix."""
+    rows = [decode_vector(value) for value in values]
+    if not rows:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.stack(rows)
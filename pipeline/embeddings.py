@@ -2,6 +2,9 @@ import pandas as pd
 from pymongo import MongoClient
 from sentence_transformers import SentenceTransformer
 
+from embedding_codec import encode_vector
+from storage import encode_unique, insert_documents
+
 # === CONNECT TO MONGODB ===
 client = MongoClient("add your mongo uri here")
 db = client["pdf_summaries"]
@@ -16,20 +19,28 @@ def embed_csv_generic(csv_file):
     
     print("Columns detected:", df.columns.tolist())
 
-    for idx, row in df.iterrows():
-        row_dict = row.to_dict()  # convert the row to a dict
+    records = df.to_dict(orient="records")
+
+    # Embed every distinct non-empty string once, in one batched encode call
+    vectors = encode_unique(
+        embedder,
+        (val for row_dict in records for val in row_dict.values() if isinstance(val, str) and val.strip()),
+    )
 
-        # For each textual field, create embeddings
-        embeddings_dict = {}
-        for col, val in row_dict.items():
-            if isinstance(val, str) and val.strip():  # only embed non-empty strings
-                embeddings_dict[col + "_embedding"] = embedder.encode(val).tolist()
+    mongo_docs = []
+    for idx, row_dict in enumerate(records):
+        # For each textual field, attach its embedding (packed binary, see embedding_codec)
+        embeddings_dict = {
+            col + "_embedding": encode_vector(vectors[val])
+            for col, val in row_dict.items()
+            if isinstance(val, str) and val.strip()
+        }
 
         # Merge original data with embeddings
-        mongo_doc = {**row_dict, **embeddings_dict, "document_id": f"ROW_{idx+1}"}
+        mongo_docs.append({**row_dict, **embeddings_dict, "document_id": f"ROW_{idx+1}"})
 
-        # Insert into MongoDB
-        collection.insert_one(mongo_doc)
+    # Bulk insert into MongoDB
+    insert_documents(collection, mongo_docs)
 
     print("✅ CSV stored in MongoDB with embeddings for all textual fields.")
 
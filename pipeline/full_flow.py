@@ -1,17 +1,35 @@
 # full_flow.py
 import os
 import re
-from typing import List, Tuple
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
 
-import spacy
 from tqdm import tqdm
-from pymongo import MongoClient
-from sentence_transformers import SentenceTransformer
-from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
-from pdf2image import convert_from_path
 from pytesseract import pytesseract
 
-from database_name_decider import get_document_heading  # ✅ your LLaMA title/domain generator
+from answer_selection import rank_answers
+from checkpoint import IngestCheckpoint
+from chunker import (
+    BOILERPLATE_EDGE_LINES, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, DEDUP_MIN_PARAGRAPH_WORDS, MIN_CHUNK_TOKENS,
+    Chunker, hf_token_counter,
+)
+from database_name_decider import get_document_heading, get_document_headings  # ✅ your LLaMA title/domain generator
+from domain_labeller import label_domains
+from inference_backend import EMBED_BACKEND, QG_BACKEND, load_embedder, load_qg_model
+from ingest_pipeline import Stage, StagePipeline
+from metrics import metrics
+from model_registry import ModelRegistry
+from ocr_engine import (
+    SOURCE_OCR, SOURCE_TEXT_LAYER, OCRPageStats, PageText, count_pages, format_page_ranges, iter_pdf_pages,
+    summarize_ocr_stats,
+)
+from storage import (
+    WRITE_BATCH_SIZE, bump_change_counter, chunk_id, embed_qa_documents, encode_unique, ensure_indexes,
+    write_chunk_documents, write_qa_documents, write_table_records,
+)
 
 # =========================
 # === CONFIGURATION =======
@@ -20,38 +38,74 @@ pytesseract.tesseract_cmd = r"add your tesseract path here"
 POPLER_PATH = r"add your poppler path here"
 MONGO_URI = "add your mongo uri here"
 
+SPACY_MODEL_NAME = "en_core_web_sm"
+QG_MODEL_NAME = "valhalla/t5-base-qg-hl"
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+
 # QG & candidate extraction config
 MAX_QUESTIONS_PER_CHUNK = 5
 MIN_ANSWER_LEN = 3
 MAX_ANSWER_LEN = 20
 
-# =========================
-# === MONGO CLIENT ========
-# =========================
-mongo_client = MongoClient(MONGO_URI)
+# Batched spaCy candidate extraction
+SPACY_BATCH_SIZE = 64
+SPACY_N_PROCESS = 1   # >1 forks spaCy workers for large documents
+CANDIDATE_PIPES = ("tok2vec", "tagger", "attribute_ruler", "parser", "ner")  # needed by NER + noun_chunks
+
+# Batched T5 question generation
+QG_BATCH_SIZE = 8
+QG_MAX_NEW_TOKENS = 64
+QG_NUM_BEAMS = 4
+
+# Pipelined ingest: workers and micro-batch size (in items) per stage
+STAGE_WORKERS = {"chunk": 1, "candidates": 1, "qg": 1, "embed": 1, "write": 1}
+STAGE_BATCH_SIZES = {"chunk": 1, "candidates": SPACY_BATCH_SIZE, "qg": 4, "embed": 16, "write": WRITE_BATCH_SIZE}
+EXTRACT_TABLES = True         # table rows of OCR'd pages (layout.py) -> "tables" collection
+HEADING_CONTEXT_CHARS = 2000  # text get_document_heading looks at -> DB name is known after this much text
+CHUNK_SETTINGS = {"max_tokens": CHUNK_MAX_TOKENS, "overlap_tokens": CHUNK_OVERLAP_TOKENS,
+                  "min_tokens": MIN_CHUNK_TOKENS, "dedup": True,
+                  "paragraph_dedup_min_words": DEDUP_MIN_PARAGRAPH_WORDS,
+                  "boilerplate_edge_lines": BOILERPLATE_EDGE_LINES}
 
 # =========================
-# === LOAD MODELS (ONCE) ==
+# === MODELS (LAZY) =======
 # =========================
-print("🔄 Loading NLP & embedding models...")
-nlp = spacy.load("en_core_web_sm")
-qg_tokenizer = AutoTokenizer.from_pretrained("valhalla/t5-base-qg-hl")
-qg_model = AutoModelForSeq2SeqLM.from_pretrained("valhalla/t5-base-qg-hl")
-embedder = SentenceTransformer("all-MiniLM-L6-v2")
+# Heavy libraries are imported inside the loaders, so importing this module
+# stays fast; each model loads on its first models.get(...) call.
+def _load_mongo_client():
+    from pymongo import MongoClient
+    return MongoClient(MONGO_URI)
+
+
+def _load_nlp():
+    import spacy
+    return spacy.load(SPACY_MODEL_NAME)
+
+
+def _load_qg_tokenizer():
+    from transformers import AutoTokenizer
+    return AutoTokenizer.from_pretrained(QG_MODEL_NAME)
+
+
+# QG_BACKEND / EMBED_BACKEND (or INFERENCE_BACKEND): torch | torch_int8 | onnx | onnx_int8 (see inference_backend.py)
+def _load_qg_model():
+    return load_qg_model(QG_MODEL_NAME, QG_BACKEND)
+
+
+def _load_embedder():
+    return load_embedder(EMBEDDING_MODEL_NAME, EMBED_BACKEND)
+
+
+models = ModelRegistry()
+models.register("mongo_client", _load_mongo_client)
+models.register("nlp", _load_nlp)
+models.register("qg_tokenizer", _load_qg_tokenizer)
+models.register("qg_model", _load_qg_model)
+models.register("embedder", _load_embedder)
 
 # =========================
 # === HELPERS =============
 # =========================
-def pdf_to_text(pdf_path: str, poppler_path: str) -> str:
-    """Convert PDF to raw OCR text using Tesseract + Poppler."""
-    pages = convert_from_path(pdf_path, dpi=300, poppler_path=poppler_path)
-    all_text = ""
-    for i, image in enumerate(pages):
-        raw_text = pytesseract.image_to_string(image)
-        all_text += f"\n\n--- Page {i + 1} ---\n{raw_text}"
-    return all_text
-
-
 def sanitize_db_name(name: str) -> str:
     """Make a safe MongoDB database name."""
     sanitized = re.sub(r"[^a-zA-Z0-9]", "_", name)
@@ -59,116 +113,421 @@ def sanitize_db_name(name: str) -> str:
     return sanitized.lower() if sanitized else "document_db"
 
 
+def make_chunker() -> Chunker:
+    """Sentence-packing chunker sized in QG tokenizer tokens (see chunker.py)."""
+    return Chunker(
+        count_tokens=hf_token_counter(models.get("qg_tokenizer")),
+        max_tokens=CHUNK_SETTINGS["max_tokens"],
+        overlap_tokens=CHUNK_SETTINGS["overlap_tokens"],
+        min_tokens=CHUNK_SETTINGS["min_tokens"],
+        dedup=CHUNK_SETTINGS["dedup"],
+        paragraph_dedup_min_words=CHUNK_SETTINGS["paragraph_dedup_min_words"],
+        boilerplate_edge_lines=CHUNK_SETTINGS["boilerplate_edge_lines"],
+    )
+
+
+def _candidates_from_doc(doc, top_n: int = MAX_QUESTIONS_PER_CHUNK) -> List[str]:
+    """Ranked candidate answers from an already-parsed spaCy doc (see answer_selection.py)."""
+    return rank_answers(doc, top_n=top_n, min_words=MIN_ANSWER_LEN, max_words=MAX_ANSWER_LEN)
+
+
+def extract_answer_candidates_batch(
+    texts: List[str],
+    batch_size: int = SPACY_BATCH_SIZE,
+    n_process: int = SPACY_N_PROCESS,
+    top_n: int = MAX_QUESTIONS_PER_CHUNK,
+) -> Dict[int, List[str]]:
+    """
+    Find candidate answers for many chunks at once with nlp.pipe.
+    Components not needed by NER / noun_chunks are disabled.
+    Returns: {chunk_index: candidates}, indexes follow the order of `texts`;
+    each chunk's candidates are merged, de-duplicated and ranked, best `top_n` first.
+    """
+    nlp = models.get("nlp")
+    disable = [name for name in nlp.pipe_names if name not in CANDIDATE_PIPES]
+    with metrics.timer("extract_answer_candidates", items=len(texts)):
+        docs = nlp.pipe(texts, batch_size=batch_size, n_process=n_process, disable=disable)
+        return {idx: _candidates_from_doc(doc, top_n) for idx, doc in enumerate(docs)}
+
+
 def extract_answer_candidates(text: str) -> List[str]:
-    """Find candidate answers using NER + noun phrases."""
-    doc = nlp(text)
-    answers = set()
-    for ent in doc.ents:
-        if MIN_ANSWER_LEN <= len(ent.text.split()) <= MAX_ANSWER_LEN:
-            answers.add(ent.text.strip())
-    for np in doc.noun_chunks:
-        if MIN_ANSWER_LEN <= len(np.text.split()) <= MAX_ANSWER_LEN:
-            answers.add(np.text.strip())
-    return list(answers)
+    """Find ranked candidate answers using NER + noun phrases."""
+    return extract_answer_candidates_batch([text])[0]
 
 
-def generate_question(context: str, answer: str) -> str | None:
-    """Generate a question given an answer inside the context."""
+def highlight_answer(context: str, answer: str) -> str | None:
+    """Build the T5 QG input with the answer wrapped in <hl> tokens (None if answer not in context)."""
     if answer not in context:
         return None
     highlighted = context.replace(answer, f"<hl> {answer} <hl>", 1)
-    input_text = f"generate question: {highlighted}"
-    inputs = qg_tokenizer([input_text], return_tensors="pt", truncation=True)
-    outputs = qg_model.generate(
-        **inputs,
-        max_new_tokens=64,
-        num_beams=4,
-        num_return_sequences=1,
-        early_stopping=True,
-    )
-    return qg_tokenizer.decode(outputs[0], skip_special_tokens=True)
+    return f"generate question: {highlighted}"
+
+
+def generate_questions_batch(qg_inputs: List[str], batch_size: int = QG_BATCH_SIZE,
+                             qg_model=None, qg_tokenizer=None) -> List[str]:
+    """
+    Generate questions for many highlighted inputs (see highlight_answer).
+    Inputs are length-sorted and padded together in batches of `batch_size`
+    to minimise padding; questions are returned in input order.
+    qg_model / qg_tokenizer default to the registry's (parity checks pass their own).
+    """
+    import torch
+
+    if qg_tokenizer is None:
+        qg_tokenizer = models.get("qg_tokenizer")
+    if qg_model is None:
+        qg_model = models.get("qg_model")
+    order = sorted(range(len(qg_inputs)), key=lambda i: len(qg_inputs[i]))
+    questions = [""] * len(qg_inputs)
+    with metrics.timer("generate_question", items=len(qg_inputs)), torch.inference_mode():
+        for start in tqdm(range(0, len(order), batch_size), desc="QG batches", disable=len(order) <= batch_size):
+            batch_idx = order[start:start + batch_size]
+            inputs = qg_tokenizer(
+                [qg_inputs[i] for i in batch_idx],
+                return_tensors="pt",
+                padding=True,
+                truncation=True,
+            )
+            outputs = qg_model.generate(
+                **inputs,
+                max_new_tokens=QG_MAX_NEW_TOKENS,
+                num_beams=QG_NUM_BEAMS,
+                num_return_sequences=1,
+                early_stopping=True,
+            )
+            for i, question in zip(batch_idx, qg_tokenizer.batch_decode(outputs, skip_special_tokens=True)):
+                questions[i] = question
+    return questions
+
+
+def generate_question(context: str, answer: str) -> str | None:
+    """Generate a question given an answer inside the context."""
+    qg_input = highlight_answer(context, answer)
+    if qg_input is None:
+        return None
+    return generate_questions_batch([qg_input])[0]
 
 # =========================
 # === MAIN PIPELINE =======
 # =========================
-def process_pdf(pdf_path: str, poppler_path: str = POPLER_PATH) -> Tuple[str, List[str], any]:
+def process_pdf(pdf_path: str, poppler_path: str = POPLER_PATH, resume: bool = True) -> Tuple[str, List[str], any]:
     """
-    Full pipeline:
-      1) OCR text from PDF
-      2) Detect overall document heading (db name source)
-      3) Split into chunks, detect per-chunk headings (domains)
-      4) Generate Q&A
-      5) Store in MongoDB with embeddings
+    Full pipeline, run as concurrent stages connected by bounded queues:
+      ocr        -> page text (text layer or OCR), streamed in page order
+      chunk      -> token-budgeted, deduplicated chunks; the first pages also give the document heading (db name)
+      candidates -> spaCy answer candidates (nlp.pipe over micro-batches of chunks)
+      qg         -> batched T5 question generation
+      embed      -> question / answer / context embeddings (packed binary, see embedding_codec)
+      write      -> bulk upserts into MongoDB
+    Afterwards the chunk embeddings are clustered into domains (one heading per cluster)
+    and every chunk is stored once in the "chunks" collection with its context embedding.
+    Every stage is checkpointed under the PDF content hash (see checkpoint.py),
+    so a re-run only does the missing work; Q&A documents are upserted on a
+    deterministic _id. resume=False discards the checkpoints first.
     Returns: (safe_db_name, unique_headings, collection)
     """
-    print("📄 Extracting text from PDF...")
-    raw_text = pdf_to_text(pdf_path, poppler_path)
+    checkpoint = IngestCheckpoint(pdf_path)
+    metrics.reset()
+    if not resume:
+        checkpoint.reset()
+    print(f"💾 Checkpoints: {checkpoint.dir}")
 
-    # Overall document heading -> DB name
-    doc_heading = get_document_heading(raw_text)
-    print(f"📌 Document heading detected: {doc_heading}")
+    # Chunk indexes key every later checkpoint -> they are only valid for the same chunk settings
+    stored_settings = checkpoint.load("chunk_settings")
+    if stored_settings != CHUNK_SETTINGS and (stored_settings or checkpoint.load("chunks") is not None):
+        print("♻️ Chunk settings changed, discarding chunk-level checkpoints")
+        checkpoint.discard("chunks.json", "questions.jsonl", "domains.json", "chunk_vectors.npy", "written.jsonl")
+    checkpoint.save("chunk_settings", CHUNK_SETTINGS)
 
-    safe_db_name = sanitize_db_name(doc_heading)
-    print(f"💡 Using MongoDB database name: {safe_db_name}")
+    done_pages = checkpoint.load_pages()
+    total_pages = count_pages(pdf_path, poppler_path)
+    missing_pages = [page for page in range(1, total_pages + 1) if page not in done_pages]
+    questions_by_chunk = checkpoint.load_chunk_results("questions")
+    written_ids = checkpoint.load_written_ids()
+    known_headings = checkpoint.load("domains")
+    # One row per chunk index; rows of chunks that failed last time are NaN
+    saved_vectors = checkpoint.load_array("chunk_vectors")
+    known_vectors: Dict[int, np.ndarray] = {}
+    if saved_vectors is not None and saved_vectors.ndim == 2:
+        known_vectors = {idx: row for idx, row in enumerate(saved_vectors) if np.isfinite(row).all()}
+    if done_pages:
+        print(f"♻️ Reusing {len(done_pages)} checkpointed pages, {len(missing_pages)} left")
+    if questions_by_chunk:
+        print(f"♻️ Reusing questions for {len(questions_by_chunk)} chunks")
+    if known_vectors:
+        print(f"♻️ Reusing embeddings of {len(known_vectors)} chunks")
 
-    db = mongo_client[safe_db_name]
-    collection = db["structured_documents"]
+    chunks: List[str] = []
+    chunker = make_chunker()
+    ocr_stats: List[OCRPageStats] = []
+    fresh_tables: Optional[Dict[int, List[dict]]] = {} if EXTRACT_TABLES else None
+    table_rows: List[dict] = []
+    chunk_vectors: Dict[int, np.ndarray] = {}
+    sources = {SOURCE_TEXT_LAYER: [], SOURCE_OCR: []}
+    heading_text: List[str] = []
+    target = {}
+    target_ready = threading.Event()
+    source_complete = threading.Event()
+    counts = {"qa_pairs": 0}
+    counts_lock = threading.Lock()
 
-    # Chunking (simple paragraph split; adjust as needed)
-    chunks = [c.strip() for c in raw_text.split("\n\n") if len(c.strip()) > 80]
-    print(f"🧩 Generating questions from {len(chunks)} chunks...")
+    # ---- ocr (pipeline source): checkpointed pages + streamed text layer / OCR for the rest ----
+    def ocr_source():
+        fresh = iter_pdf_pages(
+            pdf_path, poppler_path, pages=missing_pages, tesseract_cmd=pytesseract.tesseract_cmd, stats=ocr_stats,
+            tables=fresh_tables,
+        )
+        for page_no in range(1, total_pages + 1):
+            if page_no in done_pages:
+                table_rows.extend(done_pages[page_no].get("tables", []))
+                yield PageText(page_no, done_pages[page_no]["text"], done_pages[page_no]["source"])
+            else:
+                with metrics.timer("pdf_to_text"):
+                    page = next(fresh)
+                page_tables = fresh_tables.pop(page.page, []) if fresh_tables is not None else []
+                table_rows.extend(page_tables)
+                checkpoint.append_page(page.page, page.text, page.source, tables=page_tables)
+                yield page
+        source_complete.set()
 
-    qa_pairs = []
-    headings_all = []
+    # ---- document heading -> database (needed before the first write) ----
+    # target_ready is always set, also on failure: the write stage waits on it and must not hang
+    def resolve_target():
+        try:
+            doc_heading = checkpoint.load("document_heading")
+            if doc_heading is None:
+                with metrics.timer("get_document_heading"):
+                    doc_heading = get_document_heading("".join(heading_text))
+                checkpoint.save("document_heading", doc_heading)
+            print(f"📌 Document heading detected: {doc_heading}")
+            safe_db_name = sanitize_db_name(doc_heading)
+            print(f"💡 Using MongoDB database name: {safe_db_name}")
+            target["doc_heading"] = doc_heading
+            target["db_name"] = safe_db_name
+            target["db"] = models.get("mongo_client")[safe_db_name]
+            target["collection"] = target["db"]["structured_documents"]
+            ensure_indexes(target["db"])
+        except Exception as e:
+            target["error"] = e
+            raise
+        finally:
+            target_ready.set()
 
-    for idx, chunk in tqdm(list(enumerate(chunks, start=1)), total=len(chunks)):
+    # ---- chunk: single worker, pages arrive in order -> chunk indexes are deterministic ----
+    def chunk_stage(pages):
+        for page in pages:
+            sources[page.source].append(page.page)
+            page_text = f"\n\n--- Page {page.page} ---\n{page.text}"
+            if not target_ready.is_set():
+                heading_text.append(page_text)
+                if sum(len(t) for t in heading_text) >= HEADING_CONTEXT_CHARS:
+                    resolve_target()
+            for c in chunker.feed(page_text):
+                chunks.append(c)
+                yield len(chunks) - 1, c
+
+    # A failed source leaves the chunker mid-document: its tail (and the heading text) is truncated.
+    # Flushing it would process and checkpoint a short last chunk under an index that holds the
+    # full text on the re-run, so nothing is flushed or checkpointed; the re-run redoes the tail.
+    def chunk_finish():
+        if not source_complete.is_set():
+            if not target_ready.is_set():
+                target["error"] = RuntimeError("text extraction failed before the document heading was known")
+                target_ready.set()
+            return []
+        tail = []
         try:
-            # Per-chunk heading (domain)
-            chunk_heading = get_document_heading(chunk)
-            headings_all.append(chunk_heading)
-
-            candidates = extract_answer_candidates(chunk)
-            used = 0
-            for answer in candidates:
-                if used >= MAX_QUESTIONS_PER_CHUNK:
-                    break
-                q = generate_question(chunk, answer)
-                if not q:
-                    continue
+            for c in chunker.flush():
+                chunks.append(c)
+                tail.append((len(chunks) - 1, c))
+        finally:
+            if not target_ready.is_set():
+                resolve_target()
+        checkpoint.save("chunks", chunks)
+        print(f"✂️ {len(chunks)} chunks, {chunker.dropped_duplicates} near-duplicate chunks and "
+              f"{chunker.dropped_paragraphs} repeated paragraphs dropped")
+        return tail
+
+    # ---- candidates: chunks whose questions are checkpointed skip spaCy ----
+    def candidates_stage(items):
+        todo = [(idx, chunk) for idx, chunk in items if idx not in questions_by_chunk]
+        candidates_by_chunk = extract_answer_candidates_batch([chunk for _, chunk in todo])
+        candidates = {idx: candidates_by_chunk[i] for i, (idx, _) in enumerate(todo)}
+        for idx, chunk in items:
+            yield idx, chunk, candidates.get(idx)
 
-                qa_pairs.append((q, answer, chunk, chunk_heading))
+    # ---- qg: batched generation over all jobs of a micro-batch of chunks ----
+    def qg_stage(items):
+        qg_jobs = []  # (chunk_idx, answer, qg_input)
+        for idx, chunk, candidates in items:
+            if idx in questions_by_chunk:
+                continue
+            for answer in candidates:  # already ranked and capped at MAX_QUESTIONS_PER_CHUNK
+                qg_input = highlight_answer(chunk, answer)
+                if qg_input is not None:
+                    qg_jobs.append((idx, answer, qg_input))
+        questions = generate_questions_batch([qg_input for _, _, qg_input in qg_jobs])
 
-                # Store immediately
-                doc_dict = {
-                    "heading": chunk_heading,        # domain
+        results = {idx: [] for idx, _, candidates in items if idx not in questions_by_chunk}
+        for (idx, answer, _), q in zip(qg_jobs, questions):
+            results[idx].append([answer, q])
+        for idx, result in results.items():
+            checkpoint.append_chunk_result("questions", idx, result)
+        for idx, chunk, _ in items:
+            yield idx, chunk, results.get(idx, questions_by_chunk.get(idx, []))
+
+    # ---- embed: every chunk gets a vector (domains need it), checkpointed ones are reused; ----
+    # ---- docs already written are skipped ----
+    def embed_stage(items):
+        embedder = models.get("embedder")
+        context_vectors = encode_unique(embedder, [chunk for idx, chunk, _ in items if idx not in known_vectors])
+        docs = []
+        for idx, chunk, qa in items:
+            chunk_vectors[idx] = known_vectors[idx] if idx in known_vectors else context_vectors[chunk]
+            for answer, q in qa:
+                if not q:
+                    continue
+                with counts_lock:
+                    counts["qa_pairs"] += 1
+                doc_id = checkpoint.document_id(idx, answer)
+                if doc_id in written_ids:
+                    continue
+                docs.append({
+                    "_id": doc_id,
+                    "heading": known_headings[idx] if known_headings else None,  # domain, set after clustering
                     "question": q,
                     "answer": answer,
                     "context": chunk,
-                    "question_embedding": embedder.encode(q).tolist(),
-                    "answer_embedding": embedder.encode(answer).tolist(),
-                    "context_embedding": embedder.encode(chunk).tolist(),
-                }
-                collection.insert_one(doc_dict)
-                used += 1
-        except Exception as e:
-            print(f"⚠️ Error in chunk {idx}: {e}")
+                    "context_id": chunk_id(checkpoint.pdf_hash, idx),  # context embedding: chunks collection
+                    "chunk_index": idx,
+                    "document_hash": checkpoint.pdf_hash,
+                })
+        embed_qa_documents(embedder, docs)
+        return docs
+
+    # ---- write: bulk upserts, one round trip per micro-batch ----
+    def write_stage(docs):
+        target_ready.wait()
+        if "error" in target:
+            raise RuntimeError(f"no target database: {target['error']}")
+        failed_ids = []
+        write_qa_documents(target["collection"], docs, failed_ids=failed_ids)
+        # Failed upserts are not recorded as written -> the re-run writes them again
+        failed = set(failed_ids)
+        checkpoint.append_written([doc for doc in docs if doc["_id"] not in failed])
+        return []
+
+    print("📄 Extracting text and generating Q&A...")
+    stages = [
+        Stage("chunk", chunk_stage, STAGE_WORKERS["chunk"], STAGE_BATCH_SIZES["chunk"], finish=chunk_finish),
+        Stage("candidates", candidates_stage, STAGE_WORKERS["candidates"], STAGE_BATCH_SIZES["candidates"]),
+        Stage("qg", qg_stage, STAGE_WORKERS["qg"], STAGE_BATCH_SIZES["qg"]),
+        Stage("embed", embed_stage, STAGE_WORKERS["embed"], STAGE_BATCH_SIZES["embed"]),
+        Stage("write", write_stage, STAGE_WORKERS["write"], STAGE_BATCH_SIZES["write"]),
+    ]
+    pipeline = StagePipeline(stages, source_name="ocr")
+    pipeline.run(ocr_source())
+    if "error" in target:
+        raise target["error"]
+
+    print(f"🧾 Text layer pages: {format_page_ranges(sources[SOURCE_TEXT_LAYER]) or 'none'}")
+    print(f"🔍 OCR pages: {format_page_ranges(sources[SOURCE_OCR]) or 'none'}")
+    if ocr_stats:
+        print(f"⏱️ OCR: {summarize_ocr_stats(ocr_stats)}")
+    if written_ids:
+        print(f"♻️ {len(written_ids)} Q&A pairs were already stored by a previous run")
+
+    db, collection, safe_db_name = target["db"], target["collection"], target["db_name"]
+
+    # A failed micro-batch drops its chunks downstream (no vector) -> skip them; a re-run retries them
+    done_chunks = [idx for idx in range(len(chunks)) if idx in chunk_vectors]
+    failed_chunks = len(chunks) - len(done_chunks)
+    if failed_chunks:
+        print(f"⚠️ {failed_chunks} chunks failed in the pipeline and were skipped, re-run to retry them")
+
+    # Domains: cluster the chunk embeddings and label each cluster once
+    vectors = np.stack([chunk_vectors[idx] for idx in done_chunks]) if done_chunks else np.zeros((0, 0))
+    if done_chunks:
+        all_vectors = np.full((len(chunks), vectors.shape[1]), np.nan, dtype=np.float32)
+        all_vectors[done_chunks] = vectors
+        checkpoint.save_array("chunk_vectors", all_vectors)
+    chunk_headings = known_headings if known_headings and len(known_headings) == len(chunks) else None
+    if chunk_headings is None and done_chunks:
+        print("🧭 Assigning domains...")
+        with metrics.timer("label_domains", items=len(done_chunks)):
+            done_headings = label_domains([chunks[idx] for idx in done_chunks], vectors,
+                                          llm_labeller=get_document_headings)
+        chunk_headings = [None] * len(chunks)
+        for idx, heading in zip(done_chunks, done_headings):
+            chunk_headings[idx] = heading
+        if not failed_chunks:
+            checkpoint.save("domains", chunk_headings)
+    chunk_headings = chunk_headings or [None] * len(chunks)
+
+    # One update per domain instead of one per document
+    chunks_by_heading: Dict[str, List[int]] = {}
+    for idx in done_chunks:
+        chunks_by_heading.setdefault(chunk_headings[idx], []).append(idx)
+    for heading, idxs in chunks_by_heading.items():
+        collection.update_many(
+            {"document_hash": checkpoint.pdf_hash, "chunk_index": {"$in": idxs}},
+            {"$set": {"heading": heading}},
+        )
 
-    # Store metadata
-    db["metadata"].insert_one({
-        "document_title": doc_heading,
-        "database_name": safe_db_name,
-        "total_chunks": len(chunks),
-        "total_qa_pairs": len(qa_pairs),
-    })
+    # Chunk texts + context embeddings, stored once per chunk (Q&A docs reference them by context_id)
+    write_chunk_documents(db["chunks"], checkpoint.pdf_hash, chunks, vectors, chunk_headings, indexes=done_chunks)
+
+    # Table rows reconstructed from the OCR word boxes (forms, ledgers)
+    if table_rows:
+        write_table_records(db["tables"], checkpoint.pdf_hash, table_rows)
+        tables_found = len({(r["page"], r["table_index"]) for r in table_rows})
+        print(f"📊 Stored {len(table_rows)} rows of {tables_found} tables")
+
+    # Store metadata (one document per PDF)
+    db["metadata"].replace_one(
+        {"_id": checkpoint.pdf_hash},
+        {
+            "document_title": target["doc_heading"],
+            "database_name": safe_db_name,
+            "total_pages": total_pages,
+            "total_chunks": len(chunks),
+            "total_qa_pairs": counts["qa_pairs"],
+        },
+        upsert=True,
+    )
+    bump_change_counter(db)
 
     # Unique headings (preserve order)
-    seen = set()
-    unique_headings = [h for h in headings_all if not (h in seen or seen.add(h))]
+    seen = {None}
+    unique_headings = [h for h in chunk_headings if not (h in seen or seen.add(h))]
 
-    print(f"✅ Stored {len(qa_pairs)} Q&A pairs in MongoDB under '{safe_db_name}'.")
+    print(f"✅ Stored {counts['qa_pairs']} Q&A pairs in MongoDB under '{safe_db_name}'.")
+    if metrics.enabled:
+        report_path = metrics.write_report(
+            f"{safe_db_name}-{time.strftime('%Y%m%d-%H%M%S')}",
+            document_hash=checkpoint.pdf_hash,
+            total_pages=total_pages,
+            total_qa_pairs=counts["qa_pairs"],
+            pipeline=pipeline.reports,
+            ocr_pages=[dict(s._asdict(), saved_seconds=round(s.saved_seconds, 3)) for s in ocr_stats],
+        )
+        print(f"📈 Metrics report: {report_path}")
     return safe_db_name, unique_headings, collection
 
 
+def open_processed_database(db_name: str) -> Optional[Tuple[str, List[str], any]]:
+    """
+    Open an already-ingested database without loading any NLP model.
+    Returns (safe_db_name, headings, collection) like process_pdf, or None if it doesn't exist.
+    """
+    client = models.get("mongo_client")
+    safe_db_name = sanitize_db_name(db_name)
+    if safe_db_name not in client.list_database_names():
+        return None
+    collection = client[safe_db_name]["structured_documents"]
+    return safe_db_name, collection.distinct("heading"), collection
+
+
 if __name__ == "__main__":
     path = input("Enter PDF path: ").strip()
     process_pdf(path)
@@ -0,0 +1,232 @@
+# inference_backend.py
+"""
+CPU inference backends for the QG (T5) and embedding (MiniLM) models.
+
+    INFERENCE_BACKEND=onnx_int8 python full_flow.py      # both models
+    QG_BACKEND=torch_int8 EMBED_BACKEND=onnx python ...  # per model
+
+Backends:
+  torch        stock fp32 PyTorch (reference)
+  torch_int8   PyTorch dynamic int8 quantization of every nn.Linear
+  onnx         ONNX Runtime export (optimum / sentence-transformers), fp32
+  onnx_int8    ONNX Runtime export + dynamic int8 quantization
+ONNX exports are written once to ONNX_CACHE_DIR and reused. Before switching
+the ingest fleet, run the parity check against fp32:
+
+    python inference_backend.py --backend onnx_int8 [--pdf ExamplePDF.pdf]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict, List
+
+import numpy as np
+
+# =========================
+# === CONFIGURATION =======
+# =========================
+BACKENDS = ("torch", "torch_int8", "onnx", "onnx_int8")
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")
+QG_BACKEND = os.getenv("QG_BACKEND", INFERENCE_BACKEND)
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", INFERENCE_BACKEND)
+ONNX_CACHE_DIR = os.getenv("ONNX_CACHE_DIR", "onnx_models")
+ONNX_QUANT_ARCH = os.getenv("ONNX_QUANT_ARCH", "avx2")   # "avx2" | "avx512" | "avx512_vnni" | "arm64"
+
+# Parity gate: a backend passes when both thresholds hold
+PARITY_MIN_EXACT_MATCH = 0.80   # share of generated questions identical to fp32
+PARITY_MIN_COSINE = 0.99        # mean cosine similarity of embeddings vs fp32
+PARITY_SAMPLES = 48
+
+
+def _check_backend(backend: str) -> None:
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}'. Choose one of {BACKENDS}")
+
+
+def _export_dir(model_name: str, kind: str) -> str:
+    return os.path.join(ONNX_CACHE_DIR, model_name.replace("/", "__"), kind)
+
+
+def _require_optimum():
+    try:
+        import optimum.onnxruntime
+    except ImportError as e:
+        raise ImportError("ONNX backends need optimum: pip install 'optimum[onnxruntime]'") from e
+    return optimum.onnxruntime
+
+
+# =========================
+# === QG MODEL ============
+# =========================
+def load_qg_model(model_name: str, backend: str = QG_BACKEND):
+    """Seq2seq QG model with a transformers-compatible generate(), on the chosen backend."""
+    _check_backend(backend)
+    if backend in ("torch", "torch_int8"):
+        import torch
+        from transformers import AutoModelForSeq2SeqLM
+
+        model = AutoModelForSeq2SeqLM.from_pretrained(model_name).eval()
+        if backend == "torch_int8":
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return model
+
+    ort = _require_optimum()
+    fp32_dir = _export_dir(model_name, "onnx")
+    if not os.path.isdir(fp32_dir):
+        print(f"📦 Exporting {model_name} to ONNX ({fp32_dir})...")
+        ort.ORTModelForSeq2SeqLM.from_pretrained(model_name, export=True).save_pretrained(fp32_dir)
+    if backend == "onnx":
+        return ort.ORTModelForSeq2SeqLM.from_pretrained(fp32_dir)
+
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+    int8_dir = _export_dir(model_name, f"onnx_int8_{ONNX_QUANT_ARCH}")
+    onnx_files = sorted(name for name in os.listdir(fp32_dir) if name.endswith(".onnx"))
+    if not os.path.isdir(int8_dir):
+        print(f"📦 Quantizing {model_name} to int8 ({int8_dir})...")
+        qconfig = getattr(AutoQuantizationConfig, ONNX_QUANT_ARCH)(is_static=False, per_channel=False)
+        for file_name in onnx_files:
+            quantizer = ort.ORTQuantizer.from_pretrained(fp32_dir, file_name=file_name)
+            quantizer.quantize(save_dir=int8_dir, quantization_config=qconfig)
+    quantized = {name.replace("_quantized", "").replace(".onnx", ""): name
+                 for name in os.listdir(int8_dir) if name.endswith("_quantized.onnx")}
+    return ort.ORTModelForSeq2SeqLM.from_pretrained(
+        int8_dir,
+        encoder_file_name=quantized["encoder_model"],
+        decoder_file_name=quantized["decoder_model"],
+        decoder_with_past_file_name=quantized.get("decoder_with_past_model"),
+        use_cache="decoder_with_past_model" in quantized,
+    )
+
+
+# =========================
+# === EMBEDDER ============
+# =========================
+def load_embedder(model_name: str, backend: str = EMBED_BACKEND):
+    """SentenceTransformer on the chosen backend (same encode() API for every backend)."""
+    _check_backend(backend)
+    from sentence_transformers import SentenceTransformer
+
+    if backend in ("torch", "torch_int8"):
+        model = SentenceTransformer(model_name, device="cpu")
+        if backend == "torch_int8":
+            import torch
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return model
+
+    export_dir = _export_dir(model_name, "sentence_transformers")
+    if not os.path.isdir(export_dir):
+        print(f"📦 Exporting {model_name} to ONNX ({export_dir})...")
+        SentenceTransformer(model_name, device="cpu", backend="onnx").save_pretrained(export_dir)
+    if backend == "onnx":
+        return SentenceTransformer(export_dir, device="cpu", backend="onnx")
+
+    int8_file = f"model_qint8_{ONNX_QUANT_ARCH}.onnx"
+    if not os.path.exists(os.path.join(export_dir, "onnx", int8_file)):
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+
+        print(f"📦 Quantizing {model_name} to int8 ({int8_file})...")
+        model = SentenceTransformer(export_dir, device="cpu", backend="onnx")
+        export_dynamic_quantized_onnx_model(model, ONNX_QUANT_ARCH, export_dir)
+    return SentenceTransformer(
+        export_dir, device="cpu", backend="onnx", model_kwargs={"file_name": f"onnx/{int8_file}"},
+    )
+
+
+# =========================
+# === PARITY CHECK ========
+# =========================
+def _timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+def parity_check(backend: str, qg_inputs: List[str], texts: List[str]) -> Dict:
+    """
+    Compare `backend` against fp32 torch on the same inputs:
+    question exact-match rate, embedding cosine similarity and speedup per model.
+    """
+    import full_flow
+
+    _check_backend(backend)
+    tokenizer = full_flow.models.get("qg_tokenizer")
+    report: Dict = {"backend": backend, "qg_inputs": len(qg_inputs), "texts": len(texts)}
+
+    reference_qg = load_qg_model(full_flow.QG_MODEL_NAME, "torch")
+    candidate_qg = load_qg_model(full_flow.QG_MODEL_NAME, backend)
+    generate = full_flow.generate_questions_batch
+    reference_q, reference_s = _timed(lambda: generate(qg_inputs, qg_model=reference_qg, qg_tokenizer=tokenizer))
+    candidate_q, candidate_s = _timed(lambda: generate(qg_inputs, qg_model=candidate_qg, qg_tokenizer=tokenizer))
+    report["question_exact_match"] = round(
+        sum(a.strip() == b.strip() for a, b in zip(reference_q, candidate_q)) / max(len(qg_inputs), 1), 4
+    )
+    report["qg_seconds"] = {"torch": round(reference_s, 3), backend: round(candidate_s, 3)}
+    report["qg_speedup"] = round(reference_s / candidate_s, 2) if candidate_s else 0.0
+    report["question_mismatches"] = [
+        {"torch": a, backend: b} for a, b in zip(reference_q, candidate_q) if a.strip() != b.strip()
+    ][:5]
+    del reference_qg, candidate_qg
+
+    reference_embedder = load_embedder(full_flow.EMBEDDING_MODEL_NAME, "torch")
+    candidate_embedder = load_embedder(full_flow.EMBEDDING_MODEL_NAME, backend)
+    reference_v, reference_s = _timed(lambda: np.asarray(reference_embedder.encode(texts), dtype=np.float32))
+    candidate_v, candidate_s = _timed(lambda: np.asarray(candidate_embedder.encode(texts), dtype=np.float32))
+    cosine = np.sum(reference_v * candidate_v, axis=1) / (
+        np.linalg.norm(reference_v, axis=1) * np.linalg.norm(candidate_v, axis=1) + 1e-12
+    )
+    report["embedding_cosine_mean"] = round(float(cosine.mean()), 5) if len(cosine) else 0.0
+    report["embedding_cosine_min"] = round(float(cosine.min()), 5) if len(cosine) else 0.0
+    report["embed_seconds"] = {"torch": round(reference_s, 3), backend: round(candidate_s, 3)}
+    report["embed_speedup"] = round(reference_s / candidate_s, 2) if candidate_s else 0.0
+
+    report["passed"] = (
+        report["question_exact_match"] >= PARITY_MIN_EXACT_MATCH
+        and report["embedding_cosine_mean"] >= PARITY_MIN_COSINE
+    )
+    return report
+
+
+def sample_inputs(pdf_path: str, limit: int = PARITY_SAMPLES):
+    """QG inputs and chunk texts from a PDF, built exactly like process_pdf does."""
+    import full_flow
+    from ocr_engine import iter_pdf_pages
+
+    chunker = full_flow.make_chunker()
+    pages = iter_pdf_pages(pdf_path, full_flow.POPLER_PATH, tesseract_cmd=full_flow.pytesseract.tesseract_cmd)
+    chunks = [c for page in pages for c in chunker.feed(page.text)] + list(chunker.flush())
+    candidates = full_flow.extract_answer_candidates_batch(chunks)
+    qg_inputs = []
+    for idx, chunk in enumerate(chunks):
+        for answer in candidates[idx]:
+            qg_input = full_flow.highlight_answer(chunk, answer)
+            if qg_input is not None:
+                qg_inputs.append(qg_input)
+    return qg_inputs[:limit], chunks[:limit * 2]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Parity + speed check of an inference backend against fp32 torch.")
+    parser.add_argument("--backend", required=True, choices=BACKENDS[1:])
+    parser.add_argument("--pdf", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "ExamplePDF.pdf"))
+    parser.add_argument("--samples", type=int, default=PARITY_SAMPLES, help="QG inputs to compare")
+    parser.add_argument("--output", help="write the report as JSON")
+    args = parser.parse_args()
+
+    qg_inputs, texts = sample_inputs(args.pdf, args.samples)
+    report = parity_check(args.backend, qg_inputs, texts)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if not report["passed"]:
+        print(f"❌ {args.backend} is below the parity thresholds "
+              f"(exact match >= {PARITY_MIN_EXACT_MATCH}, cosine >= {PARITY_MIN_COSINE})")
+        sys.exit(1)
+    print(f"✅ {args.backend} matches fp32 within the thresholds")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+# ingest_pipeline.py
+import queue
+import threading
+import time
+from typing import Callable, Iterable, List, Optional
+
+# =========================
+# === CONFIGURATION =======
+# =========================
+QUEUE_SIZE = 32               # bounded queue in front of every stage (backpressure)
+DEPTH_SAMPLE_SECONDS = 0.2    # how often queue depths are sampled
+
+_STOP = object()
+
+
+# =========================
+# === STAGE ===============
+# =========================
+class Stage:
+    """
+    One pipeline stage: `workers` threads read micro-batches of up to
+    `batch_size` items from a bounded input queue and call fn(batch), which
+    returns the items for the next stage (any number, possibly none).
+    `finish()` runs once after the last item, its return value is passed on too.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        fn: Callable[[List], Iterable],
+        workers: int = 1,
+        batch_size: int = 1,
+        queue_size: int = QUEUE_SIZE,
+        finish: Optional[Callable[[], Optional[Iterable]]] = None,
+    ):
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.batch_size = batch_size
+        self.finish = finish
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.items_in = 0
+        self.items_out = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.depth_samples: List[int] = []
+        self._lock = threading.Lock()
+
+    def report(self, wall_seconds: float) -> dict:
+        depth = self.depth_samples or [0]
+        return {
+            "stage": self.name,
+            "workers": self.workers,
+            "items_in": self.items_in,
+            "items_out": self.items_out,
+            "errors": self.errors,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "items_per_sec": round(self.items_in / wall_seconds, 2) if wall_seconds else 0.0,
+            "utilization": round(self.busy_seconds / (wall_seconds * self.workers), 3) if wall_seconds else 0.0,
+            "queue_max": max(depth),
+            "queue_avg": round(sum(depth) / len(depth), 1),
+        }
+
+
+# =========================
+# === PIPELINE ============
+# =========================
+class StagePipeline:
+    """
+    Producer/consumer pipeline: a source iterator feeds stage 1, every stage
+    feeds the next through its bounded queue, all stages run concurrently.
+    Wall time approaches the slowest stage instead of the sum of all stages;
+    per-stage reports (throughput, utilisation, queue depths) show which one.
+    """
+
+    def __init__(self, stages: List[Stage], source_name: str = "source"):
+        self.stages = stages
+        self.source_name = source_name
+        self.results: List = []
+        self.reports: List[dict] = []
+
+    def _emit(self, downstream: Optional[Stage], outputs: Iterable, stage: Stage) -> None:
+        for output in outputs:
+            with stage._lock:
+                stage.items_out += 1
+            if downstream is None:
+                self.results.append(output)
+            else:
+                downstream.queue.put(output)
+
+    def _work(self, stage: Stage, downstream: Optional[Stage], remaining: List[int]) -> None:
+        stopped = False
+        while not stopped:
+            item = stage.queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            while len(batch) < stage.batch_size:
+                try:
+                    item = stage.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopped = True
+                    break
+                batch.append(item)
+
+            started = time.perf_counter()
+            try:
+                outputs = list(stage.fn(batch))
+            except Exception as e:
+                outputs = []
+                with stage._lock:
+                    stage.errors += len(batch)
+                print(f"⚠️ Error in stage '{stage.name}': {e}")
+            with stage._lock:
+                stage.items_in += len(batch)
+                stage.busy_seconds += time.perf_counter() - started
+            self._emit(downstream, outputs, stage)
+
+        with stage._lock:
+            remaining[0] -= 1
+            last_worker = remaining[0] == 0
+        if last_worker:
+            if stage.finish is not None:
+                try:
+                    self._emit(downstream, stage.finish() or [], stage)
+                except Exception as e:
+                    print(f"⚠️ Error finishing stage '{stage.name}': {e}")
+            if downstream is not None:
+                for _ in range(downstream.workers):
+                    downstream.queue.put(_STOP)
+
+    def _sample_depths(self, done: threading.Event) -> None:
+        while not done.wait(DEPTH_SAMPLE_SECONDS):
+            for stage in self.stages:
+                stage.depth_samples.append(stage.queue.qsize())
+
+    def run(self, source: Iterable) -> List:
+        """Feed `source` through all stages; returns the last stage's outputs."""
+        threads = []
+        for i, stage in enumerate(self.stages):
+            downstream = self.stages[i + 1] if i + 1 < len(self.stages) else None
+            remaining = [stage.workers]
+            for w in range(stage.workers):
+                thread = threading.Thread(
+                    target=self._work, args=(stage, downstream, remaining),
+                    name=f"{stage.name}-{w}", daemon=True,
+                )
+                thread.start()
+                threads.append(thread)
+
+        done = threading.Event()
+        monitor = threading.Thread(target=self._sample_depths, args=(done,), daemon=True)
+        monitor.start()
+
+        started = time.perf_counter()
+        source_items = 0
+        source_error = None
+        try:
+            for item in source:
+                source_items += 1
+                self.stages[0].queue.put(item)
+        except Exception as e:
+            source_error = e
+        finally:
+            source_seconds = time.perf_counter() - started
+            for _ in range(self.stages[0].workers):
+                self.stages[0].queue.put(_STOP)
+            for thread in threads:
+                thread.join()
+            done.set()
+            monitor.join()
+
+        wall_seconds = time.perf_counter() - started
+        self.reports = [{
+            "stage": self.source_name,
+            "workers": 1,
+            "items_in": source_items,
+            "items_out": source_items,
+            "errors": int(source_error is not None),
+            "busy_seconds": round(source_seconds, 3),
+            "items_per_sec": round(source_items / source_seconds, 2) if source_seconds else 0.0,
+        }] + [stage.report(wall_seconds) for stage in self.stages]
+        self.print_report(wall_seconds)
+
+        if source_error is not None:
+            raise source_error
+        return self.results
+
+    def print_report(self, wall_seconds: float) -> None:
+        print(f"\n⏱️ Pipeline finished in {wall_seconds:.1f}s")
+        print(f"{'stage':<12}{'workers':>8}{'items':>8}{'items/s':>10}{'util':>7}{'q max':>7}{'q avg':>7}{'errors':>8}")
+        for r in self.reports:
+            print(
+                f"{r['stage']:<12}{r['workers']:>8}{r['items_in']:>8}{r['items_per_sec']:>10}"
+                f"{r.get('utilization', ''):>7}{r.get('queue_max', ''):>7}{r.get('queue_avg', ''):>7}{r['errors']:>8}"
+            )
@@ -0,0 +1,169 @@
+# layout.py
+"""
+Blocks, reading order and table grids from one Tesseract image_to_data pass.
+
+The word boxes are put in a DataFrame once; every step below is a vectorized
+sort / diff / cumsum / groupby over those arrays, never a loop over words:
+  blocks  Tesseract blocks with bounding boxes, ordered column by column
+          (a block starting right of every block before it opens a column)
+  rows    words whose vertical centres are within ROW_TOLERANCE line heights
+  cells   words of a row separated by less than CELL_GAP line heights
+  tables  runs of >= TABLE_MIN_ROWS consecutive rows with >= TABLE_MIN_COLUMNS
+          cells; columns come from the same sweep over the cells' x extents
+Tables are DataFrames (first row as header when it looks like one);
+table_records turns them into one document per row for insert_many.
+"""
+from typing import List, NamedTuple, Optional
+
+import pandas as pd
+
+# =========================
+# === CONFIGURATION =======
+# =========================
+LAYOUT_MIN_CONFIDENCE = 30.0   # words below this Tesseract confidence are treated as noise
+ROW_TOLERANCE = 0.5            # max vertical centre distance within a row, in median word heights
+CELL_GAP = 1.5                 # horizontal gap that separates two cells, in median word heights
+TABLE_MIN_ROWS = 3
+TABLE_MIN_COLUMNS = 2
+TABLE_MAX_CELL_WORDS = 8.0     # mean words per cell above this -> multi-column prose, not a table
+
+WORD_LEVEL = 5                 # image_to_data level of word boxes
+WORD_FIELDS = ("level", "block_num", "par_num", "line_num", "word_num",
+               "left", "top", "width", "height", "conf", "text")
+BLOCK_COLUMNS = ["block_num", "column", "left", "top", "right", "bottom", "words", "text"]
+
+
+class PageLayout(NamedTuple):
+    page: int
+    blocks: pd.DataFrame        # BLOCK_COLUMNS, in reading order
+    tables: List[pd.DataFrame]  # one grid per detected table, top to bottom
+
+
+# =========================
+# === WORDS ===============
+# =========================
+def words_frame(data: dict, min_confidence: float = LAYOUT_MIN_CONFIDENCE) -> pd.DataFrame:
+    """Recognised words of an image_to_data dict with their boxes (right, bottom and centre added)."""
+    words = pd.DataFrame({field: data[field] for field in WORD_FIELDS})
+    words["conf"] = pd.to_numeric(words["conf"], errors="coerce")
+    words["text"] = words["text"].astype(str).str.strip()
+    words = words[(words["level"] == WORD_LEVEL) & (words["text"] != "") & (words["conf"] >= min_confidence)]
+    return words.assign(
+        right=words["left"] + words["width"],
+        bottom=words["top"] + words["height"],
+        cy=words["top"] + words["height"] / 2,
+    ).reset_index(drop=True)
+
+
+def _join(texts: pd.Series, keys, sep: str = " ") -> pd.Series:
+    """texts concatenated per key, in order (a cythonized sum; ~5x faster than groupby(...).agg(" ".join))."""
+    return (texts + sep).groupby(keys).sum().str[:-len(sep)]
+
+
+def _column_ids(boxes: pd.DataFrame) -> pd.Series:
+    """Column per box of `boxes` (sorted by left): a box starting right of all earlier boxes opens a column."""
+    previous_right = boxes["right"].cummax().shift(fill_value=-1)
+    return (boxes["left"] > previous_right).cumsum() - 1
+
+
+# =========================
+# === BLOCKS ==============
+# =========================
+def blocks_in_reading_order(words: pd.DataFrame) -> pd.DataFrame:
+    """One row per Tesseract block (box, word count, text with one line per OCR line), column by column."""
+    if words.empty:
+        return pd.DataFrame(columns=BLOCK_COLUMNS)
+    ordered = words.sort_values(["block_num", "par_num", "line_num", "word_num"])
+    lines = _join(ordered["text"], [ordered["block_num"], ordered["par_num"], ordered["line_num"]])
+    blocks = ordered.groupby("block_num").agg(
+        left=("left", "min"), top=("top", "min"), right=("right", "max"), bottom=("bottom", "max"),
+        words=("text", "size"),
+    )
+    blocks["text"] = _join(lines, lines.index.get_level_values("block_num"), "\n")
+    blocks = blocks.reset_index().sort_values(["left", "top"], kind="stable")
+    blocks["column"] = _column_ids(blocks)
+    return blocks.sort_values(["column", "top"], kind="stable")[BLOCK_COLUMNS].reset_index(drop=True)
+
+
+# =========================
+# === TABLES ==============
+# =========================
+def _cells(words: pd.DataFrame) -> pd.DataFrame:
+    """Words grouped into visual rows, then into cells by horizontal gaps."""
+    line_height = float(words["height"].median())
+    words = words.sort_values("cy", kind="stable")
+    words = words.assign(row=(words["cy"].diff() > ROW_TOLERANCE * line_height).cumsum())
+    words = words.sort_values(["row", "left"], kind="stable")
+    gap = words["left"] - words.groupby("row")["right"].shift()
+    words = words.assign(cell=(gap.isna() | (gap > CELL_GAP * line_height)).cumsum())
+    cells = words.groupby("cell").agg(
+        row=("row", "first"), left=("left", "min"), right=("right", "max"), words=("text", "size"),
+    )
+    cells["text"] = _join(words["text"], words["cell"])
+    return cells.reset_index(drop=True)
+
+
+def _with_header(grid: pd.DataFrame) -> pd.DataFrame:
+    """First row becomes the header if it is complete and unique, else col_1..col_n."""
+    first = grid.iloc[0]
+    # MongoDB field names must not contain "." or start with "$"
+    names = first.str.replace(".", "_", regex=False).str.lstrip("$").str.strip()
+    if len(grid) > 1 and (names != "").all() and names.is_unique:
+        grid = grid.iloc[1:].set_axis(list(names), axis=1)
+    else:
+        grid = grid.set_axis([f"col_{i + 1}" for i in range(grid.shape[1])], axis=1)
+    return grid.reset_index(drop=True)
+
+
+def _grid(cells: pd.DataFrame) -> Optional[pd.DataFrame]:
+    """Row x column grid of one table's cells (None if it collapses to fewer than TABLE_MIN_COLUMNS)."""
+    cells = cells.sort_values(["left", "row"], kind="stable")
+    cells = cells.assign(column=_column_ids(cells))
+    if cells["column"].nunique() < TABLE_MIN_COLUMNS:
+        return None
+    grid = _join(cells["text"], [cells["row"], cells["column"]]).unstack(fill_value="")
+    return _with_header(grid.reset_index(drop=True))
+
+
+def detect_tables(words: pd.DataFrame) -> List[pd.DataFrame]:
+    """Tables of a page as DataFrames, top to bottom."""
+    if words.empty:
+        return []
+    cells = _cells(words)
+    cells_per_row = cells.groupby("row").size()
+    multi = cells_per_row >= TABLE_MIN_COLUMNS
+    run = (multi != multi.shift()).cumsum()
+    tables = []
+    for _, rows in cells_per_row[multi].groupby(run[multi]):
+        if len(rows) < TABLE_MIN_ROWS:
+            continue
+        table_cells = cells[cells["row"].isin(rows.index)]
+        if table_cells["words"].mean() > TABLE_MAX_CELL_WORDS:
+            continue
+        grid = _grid(table_cells)
+        if grid is not None:
+            tables.append(grid)
+    return tables
+
+
+# =========================
+# === PUBLIC API ==========
+# =========================
+def analyze_layout(data: dict, page: int = 0) -> PageLayout:
+    """Blocks in reading order and tables of one page's image_to_data output."""
+    words = words_frame(data)
+    return PageLayout(page, blocks_in_reading_order(words), detect_tables(words))
+
+
+def table_records(table: pd.DataFrame, page: int, table_index: int) -> List[dict]:
+    """One insert-ready document per table row: {page, table_index, row_index, cells: {header: value}}."""
+    return [
+        {"page": page, "table_index": table_index, "row_index": row_index, "cells": cells}
+        for row_index, cells in enumerate(table.to_dict("records"))
+    ]
+
+
+def page_table_records(data: dict, page: int) -> List[dict]:
+    """Records of every table on a page (what the OCR workers send back instead of the word boxes)."""
+    tables = detect_tables(words_frame(data))
+    return [record for index, table in enumerate(tables) for record in table_records(table, page, index)]
@@ -0,0 +1,171 @@
+# llm_cache.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+# =========================
+# === CONFIGURATION =======
+# =========================
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llm_cache.sqlite")
+LLM_CACHE_TTL_SECONDS = 30 * 24 * 3600    # entries older than this are misses
+LLM_CACHE_MAX_ENTRIES = 50_000            # least recently used entries are evicted beyond this
+LLM_CACHE_NONDETERMINISTIC = True         # False -> never cache calls with temperature > 0
+EVICTION_CHECK_EVERY = 100                # writes between size checks
+
+
+# =========================
+# === CACHE ===============
+# =========================
+class LLMCache:
+    """
+    Content-addressed on-disk cache for chat completions.
+    Key = sha256 of (model, messages, sampling params); value = the response text.
+    """
+
+    def __init__(
+        self,
+        path: str = LLM_CACHE_PATH,
+        ttl_seconds: float = LLM_CACHE_TTL_SECONDS,
+        max_entries: int = LLM_CACHE_MAX_ENTRIES,
+        cache_nondeterministic: bool = LLM_CACHE_NONDETERMINISTIC,
+    ):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.cache_nondeterministic = cache_nondeterministic
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            " key TEXT PRIMARY KEY,"
+            " model TEXT,"
+            " response TEXT,"
+            " created_at REAL,"
+            " last_access REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_access ON llm_cache (last_access)")
+
+    @staticmethod
+    def make_key(model: str, messages: List[dict], params: Dict) -> str:
+        payload = json.dumps({"model": model, "messages": messages, "params": params}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            response, created_at = row
+            if now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+            return response
+
+    def set(self, key: str, model: str, response: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, model, response, created_at, last_access)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, model, response, now, now),
+            )
+            self._writes += 1
+            if self._writes % EVICTION_CHECK_EVERY == 0:
+                self._evict()
+
+    def _evict(self) -> None:
+        """Drop expired entries, then least recently used ones beyond max_entries."""
+        self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM llm_cache WHERE key IN"
+                " (SELECT key FROM llm_cache ORDER BY last_access ASC LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+    def complete(self, call: Callable[..., str], model: str, messages: List[dict], **params) -> str:
+        """
+        Return the cached response for (model, messages, params), or run
+        call(model=..., messages=..., **params) and cache its result.
+        Failed calls (exceptions) are never cached.
+        """
+        if params.get("temperature") and not self.cache_nondeterministic:
+            self.skipped += 1
+            return call(model=model, messages=messages, **params)
+
+        key = self.make_key(model, messages, params)
+        cached = self.get(key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        self.misses += 1
+        response = call(model=model, messages=messages, **params)
+        self.set(key, model, response)
+        return response
+
+    async def acomplete(self, call: Callable[..., Awaitable[str]], model: str, messages: List[dict], **params) -> str:
+        """Async twin of complete() for coroutine-based clients (see llm_gateway)."""
+        if params.get("temperature") and not self.cache_nondeterministic:
+            self.skipped += 1
+            return await call(model=model, messages=messages, **params)
+
+        key = self.make_key(model, messages, params)
+        cached = self.get(key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        self.misses += 1
+        response = await call(model=model, messages=messages, **params)
+        self.set(key, model, response)
+        return response
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            (entries,) = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "skipped": self.skipped, "entries": entries}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+# =========================
+# === SHARED INSTANCE =====
+# =========================
+_cache: Optional[LLMCache] = None
+_cache_pid: Optional[int] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> LLMCache:
+    """Process-wide cache shared by all LLM call sites (reopened after fork)."""
+    global _cache, _cache_pid
+    with _cache_lock:
+        if _cache is None or _cache_pid != os.getpid():
+            _cache = LLMCache()
+            _cache_pid = os.getpid()
+        return _cache
+
+
+def cached_completion(call: Callable[..., str], model: str, messages: List[dict], **params) -> str:
+    """Shortcut for get_cache().complete(...)."""
+    return get_cache().complete(call, model, messages, **params)
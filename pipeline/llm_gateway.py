@@ -0,0 +1,160 @@
+# llm_gateway.py
+import asyncio
+import random
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+from llm_cache import get_cache
+
+# =========================
+# === CONFIGURATION =======
+# =========================
+GROQ_BASE_URL = "https://api.groq.com/openai/v1"   # OpenAI-compatible chat completions
+MAX_CONCURRENCY = 8              # requests in flight at once
+RATE_LIMIT_PER_SECOND = 5.0      # token bucket refill rate
+RATE_LIMIT_BURST = 10            # token bucket capacity
+MAX_RETRIES = 5
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 30.0
+REQUEST_TIMEOUT_SECONDS = 60.0
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+# =========================
+# === RATE LIMITING =======
+# =========================
+class TokenBucket:
+    """Async token bucket: `rate` requests per second on average, bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def _retry_delay(response: Optional[httpx.Response], attempt: int) -> float:
+    """Honour Retry-After when the server sends it, else exponential backoff with full jitter."""
+    if response is not None:
+        retry_after = response.headers.get("retry-after")
+        if retry_after:
+            try:
+                return min(float(retry_after), BACKOFF_MAX_SECONDS)
+            except ValueError:
+                pass
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+
+# =========================
+# === GATEWAY =============
+# =========================
+class AsyncLLMGateway:
+    """
+    Concurrent client for OpenAI-compatible /chat/completions endpoints (Groq, HF router, local stubs):
+      - one pooled httpx.AsyncClient, connections are reused
+      - at most `max_concurrency` requests in flight, paced by a token bucket
+      - 429 / 5xx / transport errors are retried with exponential backoff
+      - responses go through the shared on-disk LLM cache
+    Use as `async with AsyncLLMGateway(...) as gateway:`.
+    """
+
+    def __init__(
+        self,
+        base_url: str = GROQ_BASE_URL,
+        api_key: str = "",
+        max_concurrency: int = MAX_CONCURRENCY,
+        rate_per_second: float = RATE_LIMIT_PER_SECOND,
+        burst: int = RATE_LIMIT_BURST,
+        max_retries: int = MAX_RETRIES,
+        timeout: float = REQUEST_TIMEOUT_SECONDS,
+        use_cache: bool = True,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.use_cache = use_cache
+        self.retries = 0
+        self._rate_per_second = rate_per_second
+        self._burst = burst
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def __aenter__(self):
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers=headers,
+            timeout=self.timeout,
+            limits=httpx.Limits(
+                max_connections=self.max_concurrency,
+                max_keepalive_connections=self.max_concurrency,
+            ),
+        )
+        # Created inside the running loop
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._bucket = TokenBucket(self._rate_per_second, self._burst)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self._client.aclose()
+        self._client = None
+
+    async def _post_completion(self, model: str, messages: List[dict], **params) -> str:
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                await self._bucket.acquire()
+                response = None
+                try:
+                    response = await self._client.post(
+                        "/chat/completions",
+                        json={"model": model, "messages": messages, **params},
+                    )
+                except httpx.TransportError:
+                    if attempt == self.max_retries:
+                        raise
+                else:
+                    if response.status_code not in RETRY_STATUS_CODES or attempt == self.max_retries:
+                        response.raise_for_status()
+                        return response.json()["choices"][0]["message"]["content"]
+                self.retries += 1
+                await asyncio.sleep(_retry_delay(response, attempt))
+
+    async def complete(self, model: str, messages: List[dict], **params) -> str:
+        """One chat completion (cached)."""
+        if not self.use_cache:
+            return await self._post_completion(model, messages, **params)
+        return await get_cache().acomplete(self._post_completion, model, messages, **params)
+
+    async def complete_many(self, requests: List[Dict], return_exceptions: bool = True) -> List:
+        """
+        Run many completions concurrently. Each request is a dict of complete() kwargs.
+        Results come back in request order; failures are returned as exceptions
+        unless return_exceptions=False.
+        """
+        return await asyncio.gather(
+            *(self.complete(**request) for request in requests),
+            return_exceptions=return_exceptions,
+        )
+
+
+def run_completions(requests: List[Dict], **gateway_kwargs) -> List:
+    """Blocking helper: run complete_many on a fresh event loop."""
+    async def _run():
+        async with AsyncLLMGateway(**gateway_kwargs) as gateway:
+            return await gateway.complete_many(requests)
+    return asyncio.run(_run())
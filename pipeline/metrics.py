@@ -0,0 +1,208 @@
+# metrics.py
+import bisect
+import json
+import math
+import os
+import sys
+import threading
+import time
+from contextlib import nullcontext
+from functools import wraps
+from typing import Dict, List, Optional
+
+try:
+    import resource  # not available on Windows
+except ImportError:
+    resource = None
+
+# =========================
+# === CONFIGURATION =======
+# =========================
+METRICS_ENABLED = os.getenv("INGEST_METRICS", "0") == "1"
+METRICS_DIR = os.getenv("INGEST_METRICS_DIR", "ingest_metrics")
+METRICS_PROMETHEUS = os.getenv("INGEST_METRICS_PROMETHEUS", "0") == "1"  # also write <report>.prom
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_NOOP = nullcontext()
+
+
+def peak_rss_bytes(children: bool = False) -> Optional[int]:
+    """Peak resident memory of this process (or of its finished children, e.g. OCR workers)."""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # ru_maxrss is in KB on Linux, in bytes on macOS
+    return usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+
+
+# =========================
+# === STAGE STATS =========
+# =========================
+class StageStats:
+    """Call count, item count and latency histogram of one stage."""
+
+    def __init__(self):
+        self.calls = 0
+        self.items = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)  # last bucket is +Inf
+
+    def observe(self, seconds: float, items: int) -> None:
+        self.calls += 1
+        self.items += items
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the histogram bucket holding the q-quantile."""
+        rank = math.ceil(q * self.calls)
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max_seconds)
+        return self.max_seconds
+
+    def report(self) -> dict:
+        return {
+            "calls": self.calls,
+            "items": self.items,
+            "total_seconds": round(self.total_seconds, 4),
+            "mean_seconds": round(self.total_seconds / self.calls, 4) if self.calls else 0.0,
+            "p50_seconds": round(self.quantile(0.5), 4),
+            "p95_seconds": round(self.quantile(0.95), 4),
+            "max_seconds": round(self.max_seconds, 4),
+            "items_per_sec": round(self.items / self.total_seconds, 2) if self.total_seconds else 0.0,
+            "histogram": {
+                **{str(bound): count for bound, count in zip(LATENCY_BUCKETS, self.buckets)},
+                "+Inf": self.buckets[-1],
+            },
+        }
+
+
+class _Timer:
+    __slots__ = ("metrics", "stage", "items", "started")
+
+    def __init__(self, metrics: "Metrics", stage: str, items: int):
+        self.metrics = metrics
+        self.stage = stage
+        self.items = items
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(self.stage, time.perf_counter() - self.started, self.items)
+        return False
+
+
+# =========================
+# === METRICS REGISTRY ====
+# =========================
+class Metrics:
+    """
+    Process-wide stage instrumentation:
+      with metrics.timer("stage", items=n): ...   # or @metrics.timed("stage")
+    records call counts, items and a latency histogram per stage. Exported
+    as a JSON report (write_report) and Prometheus text (to_prometheus).
+    Disabled (the default, INGEST_METRICS=1 enables it) a timer is a shared
+    no-op context manager, so instrumented code pays one attribute check.
+    """
+
+    def __init__(self, enabled: bool = METRICS_ENABLED):
+        self.enabled = enabled
+        self._stats: Dict[str, StageStats] = {}
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+
+    def enable(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats = {}
+            self._started = time.perf_counter()
+
+    def timer(self, stage: str, items: int = 1):
+        if not self.enabled:
+            return _NOOP
+        return _Timer(self, stage, items)
+
+    def timed(self, stage: str):
+        """Decorator form of timer() (one item per call)."""
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                with _Timer(self, stage, 1):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def observe(self, stage: str, seconds: float, items: int = 1) -> None:
+        with self._lock:
+            stats = self._stats.get(stage)
+            if stats is None:
+                stats = self._stats[stage] = StageStats()
+            stats.observe(seconds, items)
+
+    def report(self, **extra) -> dict:
+        """JSON-serialisable snapshot; `extra` is merged in (e.g. pipeline stage reports)."""
+        with self._lock:
+            stages = {name: stats.report() for name, stats in self._stats.items()}
+        return {
+            "wall_seconds": round(time.perf_counter() - self._started, 3),
+            "peak_rss_bytes": peak_rss_bytes(),
+            "peak_rss_children_bytes": peak_rss_bytes(children=True),
+            "stages": stages,
+            **extra,
+        }
+
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition format (histogram + items counter per stage)."""
+        lines: List[str] = [
+            "# HELP ingest_stage_seconds Latency of instrumented ingest stages.",
+            "# TYPE ingest_stage_seconds histogram",
+        ]
+        with self._lock:
+            stats_items = sorted(self._stats.items())
+        for name, stats in stats_items:
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, stats.buckets):
+                cumulative += count
+                lines.append(f'ingest_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'ingest_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {stats.calls}')
+            lines.append(f'ingest_stage_seconds_sum{{stage="{name}"}} {stats.total_seconds}')
+            lines.append(f'ingest_stage_seconds_count{{stage="{name}"}} {stats.calls}')
+        lines += [
+            "# HELP ingest_stage_items_total Items processed by instrumented ingest stages.",
+            "# TYPE ingest_stage_items_total counter",
+        ]
+        lines += [f'ingest_stage_items_total{{stage="{name}"}} {stats.items}' for name, stats in stats_items]
+        rss = peak_rss_bytes()
+        if rss is not None:
+            lines += [
+                "# HELP ingest_peak_rss_bytes Peak resident memory of the ingest process.",
+                "# TYPE ingest_peak_rss_bytes gauge",
+                f"ingest_peak_rss_bytes {rss}",
+            ]
+        return "\n".join(lines) + "\n"
+
+    def write_report(self, name: str, directory: str = METRICS_DIR,
+                     prometheus: bool = METRICS_PROMETHEUS, **extra) -> str:
+        """Write <directory>/<name>.json (and <name>.prom); returns the JSON path."""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{name}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(**extra), f, indent=2)
+        if prometheus:
+            with open(os.path.join(directory, f"{name}.prom"), "w", encoding="utf-8") as f:
+                f.write(self.to_prometheus())
+        return path
+
+
+metrics = Metrics()
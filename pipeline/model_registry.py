@@ -0,0 +1,48 @@
+# model_registry.py
+import threading
+import time
+from typing import Any, Callable, Dict
+
+
+class ModelRegistry:
+    """
+    Lazily loaded, process-wide models/clients:
+      - register(name, loader) is free; the loader runs on the first get(name)
+      - loading is thread-safe (one lock per model, double-checked)
+      - load_times records how long each loader took
+      - preload() loads models up front (e.g. once per worker process)
+    """
+
+    def __init__(self):
+        self._loaders: Dict[str, Callable[[], Any]] = {}
+        self._models: Dict[str, Any] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self.load_times: Dict[str, float] = {}
+
+    def register(self, name: str, loader: Callable[[], Any]) -> None:
+        self._loaders[name] = loader
+        self._locks.setdefault(name, threading.Lock())
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._models
+
+    def get(self, name: str) -> Any:
+        model = self._models.get(name)
+        if model is not None:
+            return model
+        if name not in self._loaders:
+            raise KeyError(f"Unknown model '{name}'. Registered: {sorted(self._loaders)}")
+        with self._locks[name]:
+            if name not in self._models:
+                print(f"🔄 Loading {name}...")
+                started = time.perf_counter()
+                self._models[name] = self._loaders[name]()
+                self.load_times[name] = time.perf_counter() - started
+                print(f"✅ Loaded {name} in {self.load_times[name]:.1f}s")
+        return self._models[name]
+
+    def preload(self, *names: str) -> Dict[str, float]:
+        """Load the given models (default: all registered). Returns load_times."""
+        for name in names or tuple(self._loaders):
+            self.get(name)
+        return dict(self.load_times)
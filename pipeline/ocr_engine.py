@@ -0,0 +1,361 @@
+# ocr_engine.py
+import os
+import shutil
+import subprocess
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from pdf2image import convert_from_path, pdfinfo_from_path
+from pytesseract import Output, pytesseract
+
+# =========================
+# === CONFIGURATION =======
+# =========================
+OCR_DPI = 300                       # full resolution (adaptive mode: only for low-confidence pages)
+OCR_ADAPTIVE = True                 # first pass at OCR_FAST_DPI, re-render below OCR_MIN_CONFIDENCE
+OCR_FAST_DPI = 150
+OCR_MIN_CONFIDENCE = 80.0           # mean Tesseract word confidence (0-100)
+OCR_GRAYSCALE = True                # render 8-bit gray instead of RGB (Tesseract binarizes anyway)
+OCR_PSM = 3                         # default page segmentation mode (3 = fully automatic)
+OCR_WINDOW_SIZE = 4                 # pages rendered per worker task (bounds memory per worker)
+OCR_WORKERS = os.cpu_count() or 1   # process pool size
+OCR_MAX_IN_FLIGHT_PER_WORKER = 2    # queued windows per worker (bounds total memory)
+OCR_THREADS_PER_WORKER = 1          # OpenMP threads per tesseract call in pool workers (one worker per core)
+
+# Native text layer (born-digital PDFs)
+USE_TEXT_LAYER = True
+MIN_TEXT_LAYER_CHARS = 40           # fewer visible chars -> treat page as image-only
+MIN_TEXT_LAYER_WORD_RATIO = 0.6     # share of "real" words required to trust the layer
+
+SOURCE_TEXT_LAYER = "text_layer"
+SOURCE_OCR = "ocr"
+
+
+class PageText(NamedTuple):
+    page: int       # 1-based page number
+    text: str
+    source: str     # SOURCE_TEXT_LAYER or SOURCE_OCR
+
+
+class OCRPageStats(NamedTuple):
+    page: int
+    dpi: int                        # resolution of the text that was kept
+    psm: int
+    confidence: float               # mean word confidence of the kept text
+    seconds: float                  # render + OCR time of all passes
+    estimated_full_seconds: float   # what one pass at OCR_DPI costs (measured if re-rendered, else scaled by pixels)
+
+    @property
+    def saved_seconds(self) -> float:
+        return self.estimated_full_seconds - self.seconds
+
+
+# =========================
+# === HELPERS =============
+# =========================
+def count_pages(pdf_path: str, poppler_path: str) -> int:
+    """Number of pages in the PDF, read from pdfinfo (no rendering)."""
+    info = pdfinfo_from_path(pdf_path, poppler_path=poppler_path)
+    return int(info["Pages"])
+
+
+def page_windows(pages: Iterable[int], window_size: int) -> List[Tuple[int, int]]:
+    """Group page numbers into contiguous (first_page, last_page) runs of at most window_size pages."""
+    windows = []
+    for page in sorted(set(pages)):
+        if windows:
+            first, last = windows[-1]
+            if page == last + 1 and last - first + 1 < window_size:
+                windows[-1] = (first, page)
+                continue
+        windows.append((page, page))
+    return windows
+
+
+def _render(pdf_path: str, poppler_path: str, first_page: int, last_page: int, dpi: int) -> list:
+    return convert_from_path(
+        pdf_path,
+        dpi=dpi,
+        poppler_path=poppler_path,
+        first_page=first_page,
+        last_page=last_page,
+        grayscale=OCR_GRAYSCALE,
+    )
+
+
+def data_to_text(data: dict) -> str:
+    """Plain text from image_to_data output: words joined per line, blank line between paragraphs."""
+    lines: Dict[tuple, List[str]] = {}
+    for i, word in enumerate(data["text"]):
+        if word and word.strip():
+            lines.setdefault((data["block_num"][i], data["par_num"][i], data["line_num"][i]), []).append(word)
+    out, previous = [], None
+    for key, words in lines.items():
+        if previous is not None and key[:2] != previous[:2]:
+            out.append("")
+        out.append(" ".join(words))
+        previous = key
+    return "\n".join(out)
+
+
+def mean_confidence(data: dict) -> float:
+    """Mean Tesseract confidence of the recognised words (0 if there are none)."""
+    confs = [float(c) for c, word in zip(data["conf"], data["text"]) if word and word.strip() and float(c) >= 0]
+    return sum(confs) / len(confs) if confs else 0.0
+
+
+def _ocr_image(image, psm: int) -> Tuple[str, dict, float]:
+    """One Tesseract pass: text, word boxes and mean confidence."""
+    data = pytesseract.image_to_data(image, config=f"--psm {psm}", output_type=Output.DICT)
+    image.close()
+    return data_to_text(data), data, mean_confidence(data)
+
+
+def _ocr_rendered_page(pdf_path: str, poppler_path: str, page: int, image, render_seconds: float,
+                       first_dpi: int, dpi: int, adaptive: bool, psm: int) -> Tuple[str, dict, OCRPageStats]:
+    """OCR a page rendered at first_dpi; in adaptive mode re-render at `dpi` if confidence is too low."""
+    started = time.perf_counter()
+    text, data, confidence = _ocr_image(image, psm)
+    seconds = render_seconds + time.perf_counter() - started
+    used_dpi = first_dpi
+    estimated_full = seconds * (dpi / first_dpi) ** 2  # Tesseract + rendering scale with pixel count
+
+    if adaptive and dpi > first_dpi and confidence < OCR_MIN_CONFIDENCE:
+        started = time.perf_counter()
+        hi_text, hi_data, hi_confidence = _ocr_image(_render(pdf_path, poppler_path, page, page, dpi)[0], psm)
+        estimated_full = time.perf_counter() - started
+        seconds += estimated_full
+        if hi_confidence >= confidence:
+            text, data, confidence, used_dpi = hi_text, hi_data, hi_confidence, dpi
+
+    stats = OCRPageStats(page, used_dpi, psm, round(confidence, 1), round(seconds, 3), round(estimated_full, 3))
+    return text, data, stats
+
+
+def limit_tesseract_threads(threads: int = OCR_THREADS_PER_WORKER) -> None:
+    """Pool initializer: cap the OpenMP threads of this process's tesseract calls (inherited via the env)."""
+    os.environ["OMP_THREAD_LIMIT"] = str(threads)
+
+
+def _ocr_window(pdf_path: str, poppler_path: str, tesseract_cmd: str, first_page: int, last_page: int,
+                dpi: int, adaptive: bool, psm_by_page: Dict[int, int],
+                extract_tables: bool = False) -> List[Tuple[str, OCRPageStats, List[dict]]]:
+    """Worker task: render one window of pages and OCR them one by one (tables from the same pass)."""
+    pytesseract.tesseract_cmd = tesseract_cmd
+    first_dpi = min(OCR_FAST_DPI, dpi) if adaptive else dpi
+    started = time.perf_counter()
+    images = _render(pdf_path, poppler_path, first_page, last_page, first_dpi)
+    render_seconds = (time.perf_counter() - started) / max(len(images), 1)
+    results = []
+    for offset, image in enumerate(images):
+        page = first_page + offset
+        text, data, stats = _ocr_rendered_page(
+            pdf_path, poppler_path, page, image, render_seconds,
+            first_dpi, dpi, adaptive, psm_by_page.get(page, OCR_PSM),
+        )
+        if extract_tables:
+            from layout import page_table_records  # pandas only in workers that need it
+            # Only the (small) table records leave the worker, not the word boxes
+            results.append((text, stats, page_table_records(data, page)))
+        else:
+            results.append((text, stats, []))
+    return results
+
+
+def ocr_page(pdf_path: str, poppler_path: str, page: int, dpi: int = OCR_DPI, adaptive: bool = OCR_ADAPTIVE,
+             psm: int = OCR_PSM, tesseract_cmd: Optional[str] = None) -> Tuple[str, dict, OCRPageStats]:
+    """OCR a single page in-process. Returns (text, image_to_data dict, stats)."""
+    if tesseract_cmd:
+        pytesseract.tesseract_cmd = tesseract_cmd
+    first_dpi = min(OCR_FAST_DPI, dpi) if adaptive else dpi
+    started = time.perf_counter()
+    image = _render(pdf_path, poppler_path, page, page, first_dpi)[0]
+    render_seconds = time.perf_counter() - started
+    return _ocr_rendered_page(pdf_path, poppler_path, page, image, render_seconds, first_dpi, dpi, adaptive, psm)
+
+
+def summarize_ocr_stats(stats: List[OCRPageStats]) -> str:
+    """One line: pages per DPI, time spent and estimated time saved vs. OCR_DPI for every page."""
+    if not stats:
+        return "no OCR pages"
+    by_dpi: Dict[int, int] = {}
+    for s in stats:
+        by_dpi[s.dpi] = by_dpi.get(s.dpi, 0) + 1
+    spent = sum(s.seconds for s in stats)
+    full = sum(s.estimated_full_seconds for s in stats)
+    dpis = ", ".join(f"{count} @ {dpi} dpi" for dpi, count in sorted(by_dpi.items()))
+    return f"{len(stats)} pages ({dpis}), {spent:.1f}s vs ~{full:.1f}s at {OCR_DPI} dpi (saved ~{full - spent:.1f}s)"
+
+
+def _pdftotext_cmd(poppler_path: Optional[str]) -> str:
+    """Locate poppler's pdftotext next to pdftoppm, falling back to PATH."""
+    if poppler_path:
+        found = shutil.which("pdftotext", path=poppler_path)
+        if found:
+            return found
+    return "pdftotext"
+
+
+def extract_text_layer(pdf_path: str, poppler_path: str) -> List[str]:
+    """
+    Embedded text of every page via poppler's pdftotext (one call, no rendering).
+    Returns one string per page, or [] if the text layer can't be read.
+    """
+    try:
+        result = subprocess.run(
+            [_pdftotext_cmd(poppler_path), "-enc", "UTF-8", pdf_path, "-"],
+            capture_output=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f"⚠️ Text layer extraction failed, falling back to OCR: {e}")
+        return []
+    # pdftotext ends every page with a form feed
+    pages = result.stdout.decode("utf-8", errors="replace").split("\f")
+    if pages and not pages[-1].strip():
+        pages.pop()
+    return pages
+
+
+def is_usable_text_layer(text: str) -> bool:
+    """Heuristic: enough visible text, mostly made of real words (not glyph garbage)."""
+    visible = "".join(text.split())
+    if len(visible) < MIN_TEXT_LAYER_CHARS or "\ufffd" in visible or "(cid:" in visible:
+        return False
+    words = text.split()
+    real_words = sum(1 for w in words if any(c.isalpha() for c in w) and sum(c.isalnum() for c in w) >= len(w) / 2)
+    return real_words / len(words) >= MIN_TEXT_LAYER_WORD_RATIO
+
+
+# =========================
+# === STREAMING OCR =======
+# =========================
+def iter_ocr_pages(
+    pdf_path: str,
+    poppler_path: str,
+    pages: Optional[Iterable[int]] = None,
+    dpi: int = OCR_DPI,
+    window_size: int = OCR_WINDOW_SIZE,
+    workers: Optional[int] = None,
+    tesseract_cmd: Optional[str] = None,
+    adaptive: bool = OCR_ADAPTIVE,
+    psm_by_page: Optional[Dict[int, int]] = None,
+    stats: Optional[List[OCRPageStats]] = None,
+    tables: Optional[Dict[int, List[dict]]] = None,
+) -> Iterator[Tuple[int, str]]:
+    """
+    Stream OCR text page by page, in page order.
+      - pages are rendered in windows of `window_size` via first_page/last_page,
+        so only a few pages are ever held in memory at once
+      - windows are OCR'd in a process pool of `workers` processes (default OCR_WORKERS)
+      - at most workers * OCR_MAX_IN_FLIGHT_PER_WORKER windows are queued
+      - adaptive: grayscale first pass at OCR_FAST_DPI, pages under OCR_MIN_CONFIDENCE
+        are re-rendered at `dpi`; psm_by_page overrides the segmentation mode per page
+    Per-page OCRPageStats are appended to `stats` (if given) as pages are yielded.
+    If `tables` is given, tables[page] = table records of that page (layout.py),
+    reconstructed in the worker from the same image_to_data pass.
+    Yields: (page_number, text), page numbers are 1-based.
+    """
+    if pages is None:
+        pages = range(1, count_pages(pdf_path, poppler_path) + 1)
+    windows = page_windows(pages, window_size)
+    if not windows:
+        return
+
+    tesseract_cmd = tesseract_cmd or pytesseract.tesseract_cmd
+    workers = max(1, min(workers or OCR_WORKERS, len(windows)))
+    psm_by_page = psm_by_page or {}
+
+    extract_tables = tables is not None
+
+    def emit(first: int, results: List[Tuple[str, OCRPageStats, List[dict]]]) -> Iterator[Tuple[int, str]]:
+        for offset, (text, page_stats, records) in enumerate(results):
+            if stats is not None:
+                stats.append(page_stats)
+            if extract_tables:
+                tables[first + offset] = records
+            yield first + offset, text
+
+    # Single worker: no point paying for a process pool
+    if workers == 1:
+        for first, last in windows:
+            yield from emit(first, _ocr_window(
+                pdf_path, poppler_path, tesseract_cmd, first, last, dpi, adaptive, psm_by_page, extract_tables
+            ))
+        return
+
+    # One process per core already uses every core; tesseract's own threads would oversubscribe them
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=limit_tesseract_threads)
+    pending = deque()
+    remaining = iter(windows)
+
+    def submit_next() -> None:
+        window = next(remaining, None)
+        if window is not None:
+            first, last = window
+            pending.append((first, pool.submit(
+                _ocr_window, pdf_path, poppler_path, tesseract_cmd, first, last, dpi, adaptive, psm_by_page,
+                extract_tables,
+            )))
+
+    try:
+        for _ in range(workers * OCR_MAX_IN_FLIGHT_PER_WORKER):
+            submit_next()
+        while pending:
+            first, future = pending.popleft()
+            results = future.result()
+            submit_next()
+            yield from emit(first, results)
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+# =========================
+# === TEXT LAYER + OCR ====
+# =========================
+def iter_pdf_pages(
+    pdf_path: str,
+    poppler_path: str,
+    pages: Optional[Iterable[int]] = None,
+    use_text_layer: bool = USE_TEXT_LAYER,
+    **ocr_kwargs,
+) -> Iterator[PageText]:
+    """
+    Stream page text in page order, choosing the cheapest usable path per page:
+      - embedded text layer when it passes is_usable_text_layer
+      - Tesseract OCR (iter_ocr_pages) for image-only / low-quality pages
+    `pages` restricts the run to those page numbers (default: all pages).
+    Yields: PageText(page, text, source).
+    """
+    if pages is None:
+        pages = range(1, count_pages(pdf_path, poppler_path) + 1)
+    pages = sorted(set(pages))
+    if not pages:
+        return
+    layer = extract_text_layer(pdf_path, poppler_path) if use_text_layer else []
+
+    layer_pages = {
+        page: layer[page - 1]
+        for page in pages
+        if page <= len(layer) and is_usable_text_layer(layer[page - 1])
+    }
+    ocr_pages = [page for page in pages if page not in layer_pages]
+    ocr_results = iter_ocr_pages(pdf_path, poppler_path, pages=ocr_pages, **ocr_kwargs)
+
+    for page in pages:
+        if page in layer_pages:
+            yield PageText(page, layer_pages[page], SOURCE_TEXT_LAYER)
+        else:
+            ocr_page, text = next(ocr_results)
+            yield PageText(ocr_page, text, SOURCE_OCR)
+
+
+def format_page_ranges(pages: Iterable[int]) -> str:
+    """[1, 2, 3, 7, 9, 10] -> '1-3, 7, 9-10'"""
+    pages = sorted(set(pages))
+    return ", ".join(
+        f"{first}-{last}" if first != last else str(first)
+        for first, last in page_windows(pages, window_size=max(len(pages), 1))
+    )
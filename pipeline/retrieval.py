@@ -0,0 +1,104 @@
+# retrieval.py
+import threading
+from collections import OrderedDict
+from typing import List, Tuple
+
+import numpy as np
+
+from chunker import TokenCounter, approx_token_counter
+from vector_index import load_index
+
+# =========================
+# === CONFIGURATION =======
+# =========================
+RETRIEVAL_TOP_K = 8              # passages considered per question
+RETRIEVAL_MIN_SCORE = 0.25       # cosine similarity below which a passage is ignored
+CONTEXT_TOKEN_BUDGET = 1500      # max tokens of PDF context sent to the LLM
+QUERY_CACHE_SIZE = 256           # query embeddings kept in memory (LRU)
+CHUNKS_COLLECTION = "chunks"
+CONTEXT_FIELD = "context_embedding"
+PASSAGE_SEPARATOR = "\n\n---\n\n"
+
+_query_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+_query_cache_lock = threading.Lock()
+
+
+# =========================
+# === QUERY EMBEDDING =====
+# =========================
+def embed_query(embedder, query: str) -> np.ndarray:
+    """Embedding of a user query; repeated questions (same words) are served from an LRU cache."""
+    key = " ".join(query.lower().split())
+    with _query_cache_lock:
+        if key in _query_cache:
+            _query_cache.move_to_end(key)
+            return _query_cache[key]
+    vector = np.asarray(embedder.encode(query), dtype=np.float32)
+    with _query_cache_lock:
+        _query_cache[key] = vector
+        if len(_query_cache) > QUERY_CACHE_SIZE:
+            _query_cache.popitem(last=False)
+    return vector
+
+
+# =========================
+# === RETRIEVAL ===========
+# =========================
+def _context_source(collection) -> Tuple[object, str, bool]:
+    """(collection, text field, legacy): the chunks collection, or the Q&A docs of older databases."""
+    chunks = collection.database[CHUNKS_COLLECTION]
+    if chunks.find_one({}, {"_id": 1}) is not None:
+        return chunks, "text", False
+    return collection, "context", True
+
+
+def retrieve_passages(collection, query_vector, k: int = RETRIEVAL_TOP_K,
+                      min_score: float = RETRIEVAL_MIN_SCORE) -> List[Tuple[str, float]]:
+    """
+    Top-k distinct context passages of the database `collection` belongs to,
+    as (text, score), best first. Search runs on the in-process vector index
+    over the stored context embeddings; only the winners' texts are fetched.
+    """
+    source, text_field, legacy = _context_source(collection)
+    # Legacy Q&A docs repeat their chunk's context -> over-fetch, duplicates are dropped below
+    hits = load_index(source, CONTEXT_FIELD).search(query_vector, k=k * 4 if legacy else k)
+    hits = [(doc_id, score) for doc_id, score in hits if score >= min_score]
+    if not hits:
+        return []
+    texts = {
+        doc["_id"]: doc.get(text_field)
+        for doc in source.find({"_id": {"$in": [doc_id for doc_id, _ in hits]}}, {text_field: 1})
+    }
+
+    passages, seen = [], set()
+    for doc_id, score in hits:
+        text = texts.get(doc_id)
+        key = " ".join(text.lower().split()) if text else ""
+        if not key or key in seen:
+            continue
+        seen.add(key)
+        passages.append((text, score))
+        if len(passages) >= k:
+            break
+    return passages
+
+
+def pack_context(passages: List[Tuple[str, float]], token_budget: int = CONTEXT_TOKEN_BUDGET,
+                 count_tokens: TokenCounter = approx_token_counter) -> List[str]:
+    """Best passages that fit in `token_budget` tokens (the best one is cut to fit if it alone is too long)."""
+    packed, used = [], 0
+    for (text, _), tokens in zip(passages, count_tokens([text for text, _ in passages])):
+        if used + tokens <= token_budget:
+            packed.append(text)
+            used += tokens
+        elif not packed:
+            words = text.split()
+            packed.append(" ".join(words[:len(words) * token_budget // tokens]))
+            used = token_budget
+    return packed
+
+
+def retrieve_context(collection, embedder, query: str, k: int = RETRIEVAL_TOP_K,
+                     token_budget: int = CONTEXT_TOKEN_BUDGET) -> List[str]:
+    """Query -> packed PDF passages for the LLM prompt (join with PASSAGE_SEPARATOR)."""
+    return pack_context(retrieve_passages(collection, embed_query(embedder, query), k), token_budget)
@@ -0,0 +1,215 @@
+# storage.py
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+from pymongo import ASCENDING, TEXT, IndexModel, ReplaceOne, ReturnDocument
+from pymongo.errors import BulkWriteError
+
+import vector_index
+from embedding_codec import encode_vector
+from metrics import metrics
+
+# =========================
+# === CONFIGURATION =======
+# =========================
+WRITE_BATCH_SIZE = 256    # documents per insert_many round trip
+EMBED_BATCH_SIZE = 64     # SentenceTransformer.encode batch size
+
+# Indexes per collection of an ingested database (created idempotently on every ingest)
+INDEXES = {
+    "structured_documents": [
+        IndexModel([("heading", ASCENDING), ("chunk_index", ASCENDING)], name="heading_chunk"),
+        IndexModel([("document_hash", ASCENDING), ("chunk_index", ASCENDING)], name="document_chunk"),
+        IndexModel([("question", TEXT)], name="question_text"),
+    ],
+    "chunks": [
+        IndexModel([("document_hash", ASCENDING), ("chunk_index", ASCENDING)], name="document_chunk"),
+    ],
+    "tables": [
+        IndexModel([("document_hash", ASCENDING), ("page", ASCENDING), ("table_index", ASCENDING)],
+                   name="document_page_table"),
+    ],
+}
+CHANGE_COUNTER_ID = "change_counter"   # metadata document bumped whenever Q&A content changes
+
+
+# =========================
+# === HELPERS =============
+# =========================
+def encode_unique(embedder, texts: Iterable[str], batch_size: int = EMBED_BATCH_SIZE) -> Dict[str, np.ndarray]:
+    """Encode every distinct text once in a single encode call. Returns {text: float32 vector}."""
+    unique_texts = list(dict.fromkeys(texts))
+    if not unique_texts:
+        return {}
+    with metrics.timer("embedder.encode", items=len(unique_texts)):
+        vectors = embedder.encode(unique_texts, batch_size=batch_size, show_progress_bar=False)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return {text: vector for text, vector in zip(unique_texts, vectors)}
+
+
+def _failed_docs(e: BulkWriteError, batch: List[dict]) -> List[dict]:
+    """Docs of `batch` that a BulkWriteError reports as not written (writeErrors index into the batch)."""
+    return [batch[error["index"]] for error in e.details.get("writeErrors", [])]
+
+
+def insert_documents(collection, docs: List[dict], batch_size: int = WRITE_BATCH_SIZE,
+                     failed_ids: Optional[List] = None) -> int:
+    """
+    Unordered insert_many in batches of `batch_size`. Returns the number of inserted docs.
+    If `failed_ids` is given, the _ids of docs that failed to insert are appended to it.
+    """
+    inserted = 0
+    for start in range(0, len(docs), batch_size):
+        batch = docs[start:start + batch_size]
+        try:
+            inserted += len(collection.insert_many(batch, ordered=False).inserted_ids)
+        except BulkWriteError as e:
+            inserted += e.details.get("nInserted", 0)
+            failed = _failed_docs(e, batch)
+            if failed_ids is not None:
+                failed_ids.extend(doc.get("_id") for doc in failed)
+            print(f"⚠️ {len(failed)} documents failed to insert: {e}")
+    return inserted
+
+
+def upsert_documents(collection, docs: List[dict], batch_size: int = WRITE_BATCH_SIZE,
+                     failed_ids: Optional[List] = None) -> int:
+    """
+    Unordered bulk_write of ReplaceOne(upsert=True) keyed by each doc's _id. Returns docs written.
+    If `failed_ids` is given, the _ids of docs that failed to upsert are appended to it.
+    """
+    written = 0
+    for start in range(0, len(docs), batch_size):
+        batch = docs[start:start + batch_size]
+        requests = [ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in batch]
+        try:
+            result = collection.bulk_write(requests, ordered=False)
+            written += result.upserted_count + result.matched_count
+        except BulkWriteError as e:
+            written += e.details.get("nUpserted", 0) + e.details.get("nMatched", 0)
+            failed = _failed_docs(e, batch)
+            if failed_ids is not None:
+                failed_ids.extend(doc["_id"] for doc in failed)
+            print(f"⚠️ {len(failed)} documents failed to upsert: {e}")
+    return written
+
+
+# =========================
+# === Q&A DOCUMENTS =======
+# =========================
+def embed_qa_documents(embedder, docs: List[dict], encode_batch_size: int = EMBED_BATCH_SIZE) -> None:
+    """
+    Attach packed question/answer embeddings (see embedding_codec) to Q&A docs, in place.
+    Every distinct question and answer is embedded once, in one encode call.
+    Context embeddings are not repeated per Q&A pair: they live once per
+    chunk in the chunks collection (write_chunk_documents), docs point to it via context_id.
+    """
+    texts = (text for doc in docs for text in (doc["question"], doc["answer"]))
+    vectors = encode_unique(embedder, texts, encode_batch_size)
+    for doc in docs:
+        doc["question_embedding"] = encode_vector(vectors[doc["question"]])
+        doc["answer_embedding"] = encode_vector(vectors[doc["answer"]])
+
+
+def write_qa_documents(collection, docs: List[dict], batch_size: int = WRITE_BATCH_SIZE,
+                       failed_ids: Optional[List] = None) -> int:
+    """
+    Store embedded Q&A docs: idempotent upserts when every doc carries an _id,
+    unordered insert_many otherwise. A loaded vector index is kept in sync.
+    Returns the number of documents written; the _ids of docs that failed are
+    appended to `failed_ids` if given (callers must not record those as written).
+    """
+    if not docs:
+        return 0
+    failed = [] if failed_ids is None else failed_ids
+    first_failed = len(failed)
+    with metrics.timer("mongo_write", items=len(docs)):
+        if all("_id" in doc for doc in docs):
+            written = upsert_documents(collection, docs, batch_size, failed)
+        else:
+            written = insert_documents(collection, docs, batch_size, failed)
+    not_written = set(failed[first_failed:])
+    vector_index.notify_inserted(collection, [doc for doc in docs if doc.get("_id") not in not_written])
+    return written
+
+
+# =========================
+# === CHUNK DOCUMENTS =====
+# =========================
+def chunk_id(document_hash: str, chunk_index: int) -> str:
+    """_id of a chunk document; Q&A docs reference it as context_id."""
+    return f"{document_hash}:{chunk_index}"
+
+
+def write_chunk_documents(collection, document_hash: str, chunks: Sequence[str], vectors,
+                          headings: Sequence[str], batch_size: int = WRITE_BATCH_SIZE,
+                          indexes: Optional[Sequence[int]] = None) -> int:
+    """
+    Upsert one document per chunk: text, domain heading and the packed context embedding.
+    `indexes` restricts the write to those chunk indexes (vectors has one row per written chunk).
+    """
+    if indexes is None:
+        indexes = range(len(chunks))
+    docs = [
+        {
+            "_id": chunk_id(document_hash, idx),
+            "document_hash": document_hash,
+            "chunk_index": idx,
+            "heading": headings[idx],
+            "text": chunks[idx],
+            "context_embedding": encode_vector(vector),
+        }
+        for idx, vector in zip(indexes, vectors)
+    ]
+    with metrics.timer("mongo_write", items=len(docs)):
+        written = upsert_documents(collection, docs, batch_size)
+    vector_index.notify_inserted(collection, docs, field="context_embedding")
+    return written
+
+
+def write_table_records(collection, document_hash: str, records: List[dict],
+                        batch_size: int = WRITE_BATCH_SIZE) -> int:
+    """Upsert one document per table row (layout.table_records), keyed by document, page, table and row."""
+    docs = [
+        {
+            "_id": f"{document_hash}:{r['page']}:{r['table_index']}:{r['row_index']}",
+            "document_hash": document_hash,
+            **r,
+        }
+        for r in records
+    ]
+    with metrics.timer("mongo_write", items=len(docs)):
+        return upsert_documents(collection, docs, batch_size)
+
+
+# =========================
+# === INDEXES =============
+# =========================
+def ensure_indexes(db) -> Dict[str, List[str]]:
+    """Create the INDEXES of every collection (no-op if present) and verify they exist."""
+    created = {}
+    for name, indexes in INDEXES.items():
+        collection = db[name]
+        collection.create_indexes(indexes)
+        existing = set(collection.index_information())
+        missing = [index.document["name"] for index in indexes if index.document["name"] not in existing]
+        if missing:
+            print(f"⚠️ Missing indexes on {db.name}.{name}: {missing}")
+        created[name] = sorted(existing)
+    return created
+
+
+# =========================
+# === CHANGE COUNTER ======
+# =========================
+def bump_change_counter(db) -> int:
+    """Mark the database's Q&A content as changed (readers drop their caches). Returns the new value."""
+    doc = db["metadata"].find_one_and_update(
+        {"_id": CHANGE_COUNTER_ID}, {"$inc": {"value": 1}}, upsert=True, return_document=ReturnDocument.AFTER,
+    )
+    return doc["value"]
+
+
+def read_change_counter(db) -> int:
+    doc = db["metadata"].find_one({"_id": CHANGE_COUNTER_ID}, {"value": 1})
+    return doc["value"] if doc else 0
@@ -0,0 +1,129 @@
+# vector_index.py
+import threading
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from embedding_codec import decode_vectors
+
+# =========================
+# === CONFIGURATION =======
+# =========================
+SIMILARITY_THRESHOLD = 0.6        # cosine score needed to trust a PDF answer over the LLM
+INDEX_FIELD = "question_embedding"
+LOAD_BATCH_SIZE = 10_000          # documents per cursor batch when loading an index
+INITIAL_CAPACITY = 1024
+
+
+# =========================
+# === VECTOR INDEX ========
+# =========================
+class VectorIndex:
+    """
+    In-process exact vector index:
+      - vectors live in one contiguous float32 matrix, L2-normalised on insert
+      - search is a single matrix-vector dot product + argpartition top-k
+      - capacity doubles on growth, so incremental adds are amortised O(1)
+      - re-adding a known id overwrites its row (upserts never duplicate)
+    """
+
+    def __init__(self):
+        self.ids: List = []
+        self._rows: Dict = {}
+        self._matrix = None
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, ids: Sequence, vectors) -> None:
+        """Append float vectors (one row per id); ids already indexed are overwritten in place."""
+        if not len(ids):
+            return
+        rows = np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1)
+        norms = np.linalg.norm(rows, axis=1, keepdims=True)
+        rows = rows / np.maximum(norms, 1e-12)
+
+        with self._lock:
+            new = []
+            for id_, row in zip(ids, rows):
+                if id_ in self._rows:
+                    self._matrix[self._rows[id_]] = row
+                else:
+                    new.append((id_, row))
+            if not new:
+                return
+            ids = [id_ for id_, _ in new]
+            rows = np.stack([row for _, row in new])
+
+            needed = self._size + len(rows)
+            if self._matrix is None:
+                self._matrix = np.empty((max(INITIAL_CAPACITY, needed), rows.shape[1]), dtype=np.float32)
+            elif needed > len(self._matrix):
+                grown = np.empty((max(needed, 2 * len(self._matrix)), rows.shape[1]), dtype=np.float32)
+                grown[:self._size] = self._matrix[:self._size]
+                self._matrix = grown
+            self._matrix[self._size:needed] = rows
+            self._rows.update((id_, self._size + i) for i, id_ in enumerate(ids))
+            self.ids.extend(ids)
+            self._size = needed
+
+    def search(self, query, k: int = 5) -> List[Tuple[object, float]]:
+        """Top-k (id, cosine similarity) pairs, best first."""
+        if not self._size:
+            return []
+        query = np.asarray(query, dtype=np.float32).ravel()
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+        with self._lock:
+            size = self._size
+            scores = self._matrix[:size] @ query
+            ids = self.ids  # append-only, rows < size are stable
+
+        k = min(k, size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(ids[i], float(scores[i])) for i in top]
+
+
+# =========================
+# === PER-DB REGISTRY =====
+# =========================
+_indexes: Dict[Tuple[str, str, str], VectorIndex] = {}
+_registry_lock = threading.Lock()
+
+
+def _index_key(collection, field: str) -> Tuple[str, str, str]:
+    return collection.database.name, collection.name, field
+
+
+def load_index(collection, field: str = INDEX_FIELD) -> VectorIndex:
+    """Build the index for `collection` from its stored (packed or legacy list) embeddings, once per database."""
+    key = _index_key(collection, field)
+    with _registry_lock:
+        if key in _indexes:
+            return _indexes[key]
+
+        index = VectorIndex()
+        ids, vectors = [], []
+        cursor = collection.find({field: {"$exists": True}}, {field: 1}).batch_size(LOAD_BATCH_SIZE)
+        for doc in cursor:
+            ids.append(doc["_id"])
+            vectors.append(doc[field])
+            if len(ids) >= LOAD_BATCH_SIZE:
+                index.add(ids, decode_vectors(vectors))
+                ids, vectors = [], []
+        index.add(ids, decode_vectors(vectors))
+
+        _indexes[key] = index
+        return index
+
+
+def notify_inserted(collection, docs: Sequence[dict], field: str = INDEX_FIELD) -> None:
+    """Add freshly inserted documents to the collection's index, if it is loaded."""
+    index = _indexes.get(_index_key(collection, field))
+    if index is None:
+        return
+    docs = [doc for doc in docs if "_id" in doc and field in doc]
+    index.add([doc["_id"] for doc in docs], decode_vectors(doc[field] for doc in docs))